@@ -0,0 +1,172 @@
+# audit.py
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, Response, stream_with_context
+from flask_cors import CORS
+import json
+import os
+import queue
+
+from model_registry import registry, register_health_routes
+from batching import register_batching_routes
+import instrumentation
+from instrumentation import span, request_scope
+from embeddings import get_embeddings, cosine_similarity, encoder_batcher
+from similarity import calculateSimilarityRating, calculate_rouge_l
+from sentiment import get_sentiments, sentiment_batcher
+from scrape import source_pages, score_source
+from fact_check import fact_check, FACT_CHECK_MODELS, claim_batcher, ner_batcher
+
+app = Flask(__name__)
+# Remedy CORS errors and related CORS shennanigans
+CORS(app)
+
+# Single-process audit pipeline: runs the similarity, sentiment, scrape and fact check stages for a QA pair in one
+# call, passing intermediate results (and embeddings, through the shared embedding cache) in memory rather than
+# through four separate services and the browser
+AUDIT_MODELS = FACT_CHECK_MODELS + ['emotion_classifier', 'rouge_scorer']
+register_health_routes(app, AUDIT_MODELS)
+register_batching_routes(app, [encoder_batcher, sentiment_batcher, claim_batcher, ner_batcher])
+instrumentation.init_app(app, 'audit', [encoder_batcher, sentiment_batcher, claim_batcher, ner_batcher])
+
+# Threads running independent stages (similarity, sentiment and one per source being scored / fact checked)
+audit_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('AUDIT_WORKERS', 8)), thread_name_prefix='audit')
+
+# Same as countSentences in the frontend: how many sentences the answer has determines how hard we search each source
+def count_sentences(text):
+    # Split by period, filter out empty strings, and return the length
+    return len([sentence for sentence in text.split('.') if sentence.strip() != ''])
+
+def similarity_stage(question, answer):
+    # Embedded once here, the question and answer embeddings are then served from the cache for the scrape stage
+    vec_question, vec_answer = get_embeddings([question, answer])
+
+    # Calculate a cosine similarity score and associated rating
+    similarity_score = float(cosine_similarity(vec_question, vec_answer))
+    similarity_rating, similarity_sentence = calculateSimilarityRating(similarity_score)
+
+    return {
+        'similarityScore': similarity_score,
+        'rougeLScore': float(calculate_rouge_l(question, answer)),
+        'similarityRating': similarity_rating,
+        'similaritySentence': similarity_sentence
+    }
+
+def sentiment_stage(question, answer):
+    (question_sentiment, question_emotion), (answer_sentiment, answer_emotion) = get_sentiments([question, answer])
+    return {
+        'question_sentiment': question_sentiment,
+        'question_emotion': question_emotion,
+        'answer_sentiment': answer_sentiment,
+        'answer_emotion': answer_emotion
+    }
+
+# Scores a source (its fetched page or indexed passages, see scrape.source_pages) against the QA pair and fact
+# checks the answer against its most relevant sentences
+def source_stage(url, page, sentence_bound, question, answer):
+    most_correlated_answer_sentence, top_2_correlated_question_sentences = score_source(url, page, sentence_bound, question, answer)
+
+    # If the article could not be parsed (ie invalid web format, anti-bot scraping detection, etc.), return placeholders
+    if not most_correlated_answer_sentence or not top_2_correlated_question_sentences:
+        return {
+            'url': url,
+            'top_2_correlated_question_sentences': [],
+            'most_correlated_answer_sentence': [],
+            'summary': ["No valid data available"],
+            'fact_check_decision': False,
+            'supporting_set': []
+        }
+
+    # Combine question sentences with the answer sentence into one summary (ie to use for summarizing the relevant bits of the whole article)
+    summary = [sentence for _, sentence in top_2_correlated_question_sentences] + [most_correlated_answer_sentence]
+    # The source was just scored in this process, so its indexed passages most relevant to the answer join the evidence
+    fact_check_decision, supporting_set = fact_check(summary, answer, url=url)
+
+    return {
+        'url': url,
+        'top_2_correlated_question_sentences': top_2_correlated_question_sentences,
+        'most_correlated_answer_sentence': most_correlated_answer_sentence,
+        'summary': summary,
+        'fact_check_decision': fact_check_decision,
+        'supporting_set': supporting_set
+    }
+
+# Runs one stage on the executor, timed into the stage latency histogram
+def submit_stage(stage, fn, *args):
+    request_id = instrumentation.current_request_id()
+
+    def timed():
+        with request_scope(request_id), span(f'{stage}_stage'):
+            return fn(*args)
+    return audit_executor.submit(timed)
+
+# Runs every stage concurrently, yielding (stage, result) pairs as each one finishes
+def run_audit(question, answer, urls, sentence_bound):
+    finished = queue.Queue()
+
+    def track(stage, future):
+        future.add_done_callback(lambda future: finished.put((stage, future)))
+
+    track('similarity', submit_stage('similarity', similarity_stage, question, answer))
+    track('sentiment', submit_stage('sentiment', sentiment_stage, question, answer))
+
+    # Each source is handed to its own stage as soon as it is available (indexed sources straight away, the rest as
+    # their pages arrive)
+    def fetch_sources():
+        for url, page in source_pages(urls, sentence_bound):
+            track('source', submit_stage('source', source_stage, url, page, sentence_bound, question, answer))
+
+    # Fetching runs alongside the similarity / sentiment stages (a failure there ends the audit with its error)
+    fetch_future = submit_stage('fetch', fetch_sources)
+    fetch_future.add_done_callback(lambda future: future.exception() and finished.put(('fetch', future)))
+
+    for _ in range(2 + len(urls)):
+        stage, future = finished.get()
+        yield stage, future.result()
+
+@app.route('/audit', methods=['POST'])
+def audit():
+    data = request.get_json()
+
+    question = data.get("question", "")
+    answer = data.get("answer", "")
+    urls = data.get("urls", [])
+    sentence_bound = data.get("sentence_bound") or count_sentences(answer)
+    stream = data.get("stream", False)
+
+    # Ensure that the QA pair and urls are in proper form
+    if not isinstance(question, str) or not isinstance(answer, str):
+        raise ValueError("question and answer must be of type: str")
+    elif not isinstance(urls, list) or not all(isinstance(item, str) for item in urls):
+        raise ValueError("urls must be of type: list of strings (string[])")
+
+    # Streaming mode sends each stage's result (one JSON object per line) as soon as it is ready
+    if stream:
+        def generate():
+            for stage, result in run_audit(question, answer, urls, sentence_bound):
+                yield json.dumps({'stage': stage, **result}) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = {'similarity': None, 'sentiment': None, 'sources': []}
+    for stage, result in run_audit(question, answer, urls, sentence_bound):
+        if stage == 'source':
+            results['sources'].append(result)
+        else:
+            results[stage] = result
+
+    return jsonify({
+        'message': 'Audit Successfully Completed',
+        'question': question,
+        'answer': answer,
+        'similarity': results['similarity'],
+        'sentiment': results['sentiment'],
+        'sources': results['sources'],
+        'num_supporting_sources': sum(1 for source in results['sources'] if source['fact_check_decision']),
+        'num_total_sources': len(results['sources'])
+    })
+
+if __name__ == '__main__':
+    # Warm every model the pipeline uses in the background, so the first audit measures inference and not disk I/O
+    # (/ready reports when they are loaded)
+    registry.start_warm_up(AUDIT_MODELS)
+    app.run(port=5006, threaded=True)
@@ -0,0 +1,202 @@
+# batching.py
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import os
+import queue
+import threading
+import time
+
+from flask import jsonify
+
+# Defaults shared by every service (each batcher can override them)
+DEFAULT_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+DEFAULT_MAX_QUEUE_SIZE = int(os.environ.get('BATCH_MAX_QUEUE_SIZE', 1024))
+# Longest a request waits for its results before giving up (0 waits forever)
+DEFAULT_TIMEOUT = float(os.environ.get('BATCH_TIMEOUT_SECONDS', 30))
+
+# Every batcher created in this process, so a server can shut them all down together
+batchers = []
+
+
+# Raised when a batcher's queue is full, so the service can shed load (503) instead of queueing without bound
+class QueueFullError(Exception):
+    pass
+
+
+# Raised when results are not ready within the timeout, so a stuck model fails the request (504) instead of
+# holding its worker thread forever
+class InferenceTimeoutError(Exception):
+    pass
+
+
+# Dynamic micro-batching inference worker. Request threads submit individual inputs and get futures back,
+# while a single worker thread coalesces whatever is queued (up to max_batch_size inputs, waiting at most
+# max_wait_ms for more to arrive) into one call of batch_fn, so concurrent requests share forward passes
+# instead of each running the model one input at a time and contending on the GIL.
+class MicroBatcher:
+    def __init__(self, name, batch_fn, max_batch_size=32, max_wait_ms=DEFAULT_MAX_WAIT_MS, max_queue_size=DEFAULT_MAX_QUEUE_SIZE, timeout=DEFAULT_TIMEOUT):
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.timeout = timeout or None
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._pid = None
+        self._closed = False
+        # Optional callback(name, batch_size, seconds) run after every batch (used to export metrics)
+        self.on_batch = None
+
+        # Metrics
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.largest_batch = 0
+        self.busy_seconds = 0.0
+        self.timed_out = 0
+        self.split_batches = 0
+
+        batchers.append(self)
+
+    # Starts the worker thread on first use (and again in a forked worker, since threads do not survive a fork)
+    def _ensure_worker(self):
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._worker = threading.Thread(target=self._run, name=f'{self.name}-batcher', daemon=True)
+                self._worker.start()
+
+    # Queues every input and returns one future per input (all or none are queued)
+    def submit_many(self, items):
+        self._ensure_worker()
+        futures = [Future() for _ in items]
+
+        with self._lock:
+            if self._closed:
+                raise QueueFullError(f"{self.name} batcher is shut down")
+            # A single oversized request is still accepted when nothing else is waiting
+            if self._queue.qsize() > 0 and self._queue.qsize() + len(futures) > self.max_queue_size:
+                self.rejected += len(futures)
+                raise QueueFullError(f"{self.name} inference queue is full ({self._queue.qsize()} waiting)")
+            for item, future in zip(items, futures):
+                self._queue.put((item, future))
+
+        return futures
+
+    def submit(self, item):
+        return self.submit_many([item])[0]
+
+    # Runs the inputs through the model (batched with any other concurrent requests) and waits for the results,
+    # for at most timeout seconds in total (the batcher's timeout by default)
+    def run_many(self, items, timeout=None):
+        futures = self.submit_many(items)
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            return [future.result(None if deadline is None else max(0, deadline - time.monotonic())) for future in futures]
+        except FutureTimeoutError:
+            # Inputs still queued are dropped rather than run for a request that has gone
+            for future in futures:
+                future.cancel()
+            self.timed_out += len(futures)
+            raise InferenceTimeoutError(f"{self.name} inference did not finish within {timeout}s")
+
+    def run(self, item, timeout=None):
+        return self.run_many([item], timeout)[0]
+
+    def _next_batch(self):
+        # Block until at least one input is waiting, then gather more until the batch is full or the wait expires
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    # Runs the inputs through batch_fn in one call and hands each future its result
+    def _run_batch(self, batch):
+        results = list(self.batch_fn([item for item, _ in batch]))
+        if len(results) != len(batch):
+            raise RuntimeError(f"{self.name} batch function returned {len(results)} results for {len(batch)} inputs")
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run(self):
+        while True:
+            # Inputs whose request already gave up (cancelled futures) are not worth running
+            batch = [(item, future) for item, future in self._next_batch() if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                else:
+                    # The batch holds inputs from several requests, so one bad input must not fail the others: each
+                    # input is run again on its own, and only the ones that fail by themselves get an error
+                    self.split_batches += 1
+                    for entry in batch:
+                        try:
+                            self._run_batch([entry])
+                        except Exception as e:
+                            entry[1].set_exception(e)
+
+            duration = time.perf_counter() - start
+            if self.on_batch is not None:
+                self.on_batch(self.name, len(batch), duration)
+
+            self.busy_seconds += duration
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+    # Stops accepting new inputs (already queued inputs are still processed)
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+    def stats(self):
+        return {
+            'queue_depth': self._queue.qsize(),
+            'max_queue_size': self.max_queue_size,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'batches': self.batches,
+            'items': self.items,
+            'average_batch_size': self.items / self.batches if self.batches else 0.0,
+            'largest_batch': self.largest_batch,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'split_batches': self.split_batches,
+            'busy_seconds': round(self.busy_seconds, 3)
+        }
+
+
+# Adds a /batch_stats route (queue depth and batch size metrics) and turns a full queue into a 503 response
+def register_batching_routes(app, batchers):
+    @app.route('/batch_stats', methods=['GET'])
+    def batch_stats():
+        return jsonify({batcher.name: batcher.stats() for batcher in batchers})
+
+    @app.errorhandler(QueueFullError)
+    def handle_queue_full(error):
+        return jsonify({'message': 'Server busy, please retry', 'error': str(error)}), 503
+
+    @app.errorhandler(InferenceTimeoutError)
+    def handle_inference_timeout(error):
+        return jsonify({'message': 'Inference timed out', 'error': str(error)}), 504
+
+# Stops every batcher in the process from accepting new inputs (used on server shutdown)
+def close_batchers():
+    for batcher in batchers:
+        batcher.close()
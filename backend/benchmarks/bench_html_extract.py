@@ -0,0 +1,69 @@
+# bench_html_extract.py
+# Compares the streaming p-tag extractor used by scrape.py against the previous
+# BeautifulSoup(html, 'html.parser') + find_all('p') path on a directory of pages.
+#
+# The default pages in synthetic_pages/ are generated filler laid out like real article pages (scripts, navigation,
+# header / footer chrome around the article's p-tags), not captured sites, so they check the two paths agree and
+# show the relative cost of each, but are no measure of the speed-up on real pages: pass --pages with a directory
+# of saved real pages for that.
+#
+# Usage (from backend/): python benchmarks/bench_html_extract.py [--pages DIR] [--repeat N] [--sentence-bound N]
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from html_extract import extract_paragraphs
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synthetic_pages')
+
+# The previous extraction path in scrape_text, kept here as the baseline
+def soup_paragraphs(html, max_paragraphs):
+    soup = BeautifulSoup(html, 'html.parser')
+    return [p_tag.get_text() for p_tag in soup.find_all('p')[:max_paragraphs]]
+
+def time_extractor(extractor, html, max_paragraphs, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        paragraphs = extractor(html, max_paragraphs)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(paragraphs)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark p-tag extraction against BeautifulSoup")
+    parser.add_argument('--pages', default=PAGES_DIR, help="directory of .html pages (default: the synthetic pages)")
+    parser.add_argument('--repeat', type=int, default=10, help="runs per page (the median is reported)")
+    parser.add_argument('--sentence-bound', type=int, default=2, help="answer sentence bound (15 paragraphs each)")
+    args = parser.parse_args()
+
+    max_paragraphs = max(1, args.sentence_bound * 15)
+    results = []
+
+    for path in sorted(glob.glob(os.path.join(args.pages, '*.html'))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            html = f.read()
+
+        soup_seconds, soup_count = time_extractor(soup_paragraphs, html, max_paragraphs, args.repeat)
+        stream_seconds, stream_count = time_extractor(extract_paragraphs, html, max_paragraphs, args.repeat)
+
+        results.append({
+            'page': os.path.basename(path),
+            'bytes': len(html),
+            'soup_ms': round(soup_seconds * 1000, 3),
+            'streaming_ms': round(stream_seconds * 1000, 3),
+            'speedup': round(soup_seconds / stream_seconds, 2) if stream_seconds else None,
+            'soup_paragraphs': soup_count,
+            'streaming_paragraphs': stream_count
+        })
+
+    print(json.dumps({'max_paragraphs': max_paragraphs, 'repeat': args.repeat, 'results': results}, indent=2))
+
+if __name__ == '__main__':
+    main()
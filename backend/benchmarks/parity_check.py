@@ -0,0 +1,149 @@
+# parity_check.py
+# Accuracy-parity check for the inference backends (see inference_backend.py). Runs the fixture QA pairs in
+# parity_fixtures.json through the full precision PyTorch models and then through the candidate backend, and
+# compares every decision the calibrated thresholds make:
+#   - the similarity rating of each question / answer pair
+#   - which evidence sentences the claim-evidence model accepts (label 0, logit bounds -0.2 / 0.805)
+#   - which side of the 0.575 / 0.77 similarity thresholds each evidence sentence falls on
+#   - the final fact check decision, and the top emotion of each question / answer
+# Raw score drift (largest cosine similarity and logit difference) is reported alongside.
+#
+# Exits non-zero if any decision differs, so a backend can be checked before it is enabled for a model.
+#
+# Usage (from backend/):
+#   python benchmarks/parity_check.py --backend onnx-int8
+#   python benchmarks/parity_check.py --backend torch-int8 --models sentence_encoder fact_check --output parity.json
+import argparse
+import json
+import os
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+
+MODELS = ['sentence_encoder', 'fact_check', 'ner', 'emotion_classifier']
+
+def parse_args():
+    from inference_backend import BACKENDS
+    parser = argparse.ArgumentParser(description="Check that an inference backend reproduces the torch decisions")
+    parser.add_argument('--backend', required=True, choices=[backend for backend in BACKENDS if backend != 'torch'])
+    parser.add_argument('--models', nargs='+', default=MODELS, choices=MODELS, help="models to run with the candidate backend")
+    parser.add_argument('--fixtures', default=os.path.join(BENCHMARKS_DIR, 'parity_fixtures.json'))
+    parser.add_argument('--output', help="write the JSON report here as well as to stdout")
+    return parser.parse_args()
+
+# Re-registers every model with the backend it should use for this run (re-registering drops the loaded instance)
+def use_backends(backends):
+    import embeddings
+    import fact_check
+    import sentiment
+    from model_registry import registry
+
+    loaders = {
+        'sentence_encoder': embeddings.load_sentence_encoder,
+        'fact_check': fact_check.load_fact_check_model,
+        'ner': fact_check.load_ner_pipeline,
+        'emotion_classifier': sentiment.load_emotion_classifier
+    }
+    for name, backend in backends.items():
+        os.environ[f'{name.upper()}_BACKEND'] = backend
+        registry.register(name, loaders[name])
+
+    start = time.perf_counter()
+    registry.warm_up(MODELS)
+    return {name: status.get('load_seconds') for name, status in registry.status(MODELS).items()}, time.perf_counter() - start
+
+# Every thresholded decision (and the raw scores behind it) for one fixture
+def decisions_for(fixture):
+    from embeddings import cosine_similarity, get_embeddings, source_similarities
+    from fact_check import fact_check, score_claims
+    from sentences import prepare_evidence_sentences
+    from sentiment import get_sentiments
+    from similarity import calculateSimilarityRating
+
+    question, answer = fixture['question'], fixture['answer']
+    vec_question, vec_answer = get_embeddings([question, answer])
+    similarity_score = float(cosine_similarity(vec_question, vec_answer))
+
+    sentences = prepare_evidence_sentences(fixture['summary'])
+    logits = score_claims(answer, sentences)
+    similarities = source_similarities(answer, sentences)
+
+    fact_check_decision, _ = fact_check(fixture['summary'], answer)
+    (_, question_emotion), (_, answer_emotion) = get_sentiments([question, answer], 16)
+
+    return {
+        'similarity_score': similarity_score,
+        'similarity_rating': calculateSimilarityRating(similarity_score)[0],
+        'logits': [list(map(float, pair)) for pair in logits],
+        'accepted': [value_1 >= value_2 and value_1 >= -0.2 and value_2 < 0.805 for value_1, value_2 in logits],
+        'sentence_similarities': [float(score) for score in similarities],
+        'similarity_bands': [(score > 0.575) + (score > 0.77) for score in similarities],
+        'fact_check_decision': fact_check_decision,
+        'emotions': [question_emotion, answer_emotion]
+    }
+
+def run(fixtures):
+    start = time.perf_counter()
+    decisions = [decisions_for(fixture) for fixture in fixtures]
+    return decisions, time.perf_counter() - start
+
+def compare(fixtures, reference, candidate):
+    mismatches = []
+    max_similarity_drift, max_logit_drift = 0.0, 0.0
+
+    for i, (fixture, expected, actual) in enumerate(zip(fixtures, reference, candidate)):
+        for key in ('similarity_rating', 'accepted', 'similarity_bands', 'fact_check_decision', 'emotions'):
+            if expected[key] != actual[key]:
+                mismatches.append({'fixture': i, 'question': fixture['question'], 'decision': key, 'torch': expected[key], 'candidate': actual[key]})
+
+        similarity_pairs = [(expected['similarity_score'], actual['similarity_score'])] + list(zip(expected['sentence_similarities'], actual['sentence_similarities']))
+        max_similarity_drift = max([max_similarity_drift] + [abs(a - b) for a, b in similarity_pairs])
+        logit_pairs = [(a, b) for expected_pair, actual_pair in zip(expected['logits'], actual['logits']) for a, b in zip(expected_pair, actual_pair)]
+        max_logit_drift = max([max_logit_drift] + [abs(a - b) for a, b in logit_pairs])
+
+    return mismatches, round(max_similarity_drift, 5), round(max_logit_drift, 5)
+
+def main():
+    args = parse_args()
+
+    # Caches would hand the candidate backend the reference backend's results, and weights must already be cached
+    os.environ['EMBEDDING_CACHE_SIZE'] = '0'
+    os.environ['EMBEDDING_CACHE_DIR'] = ''
+    os.environ['SENTIMENT_CACHE_SIZE'] = '0'
+    os.environ['SOURCE_INDEX_MAX_SOURCES'] = '0'
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+    with open(args.fixtures) as f:
+        fixtures = json.load(f)
+
+    reference_load, _ = use_backends({name: 'torch' for name in MODELS})
+    reference, reference_seconds = run(fixtures)
+
+    candidate_load, _ = use_backends({name: args.backend if name in args.models else 'torch' for name in MODELS})
+    candidate, candidate_seconds = run(fixtures)
+
+    mismatches, max_similarity_drift, max_logit_drift = compare(fixtures, reference, candidate)
+    report = {
+        'backend': args.backend,
+        'models': args.models,
+        'fixtures': len(fixtures),
+        'model_load_seconds': {'torch': reference_load, args.backend: candidate_load},
+        'run_seconds': {'torch': round(reference_seconds, 3), args.backend: round(candidate_seconds, 3)},
+        'max_similarity_drift': max_similarity_drift,
+        'max_logit_drift': max_logit_drift,
+        'mismatches': mismatches
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+    sys.exit(1 if mismatches else 0)
+
+if __name__ == '__main__':
+    main()
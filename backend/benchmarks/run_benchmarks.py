@@ -0,0 +1,276 @@
+# run_benchmarks.py
+# Reproducible latency / throughput benchmark for the Python services. Each service's Flask app is driven
+# in-process through its test client (so only the service itself is measured), scraping is pointed at the
+# synthetic pages served by a local stub server, and every run uses the fixed QA-pair corpus in qa_pairs.json.
+#
+# Every concurrency level is measured cold, with every in-process cache (embeddings, sentiments, pages, ROUGE tokens
+# and the source index) turned off so each request takes the model / network path, and then warm, with the caches
+# on and already filled by a first pass over the payloads. Thresholds apply to the cold numbers, since warm requests
+# are mostly cache lookups that would hide a slower model path.
+#
+# Reports per-endpoint p50 / p95 / p99 latency and throughput at each concurrency level, model load time,
+# each service's cold import time and peak RSS as JSON, and exits non-zero if any threshold in thresholds.json is
+# exceeded (or a service imports one of the heavy ML libraries at startup instead of when its models load).
+#
+# Usage (from backend/):
+#   python benchmarks/run_benchmarks.py --stub-models              # fully offline, no model weights needed
+#   python benchmarks/run_benchmarks.py --concurrency 1 4 8 --requests 64 --output bench.json
+#   INFERENCE_BACKEND=onnx-int8 python benchmarks/run_benchmarks.py     # compare a backend (see inference_backend.py)
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+
+ENDPOINTS = ['similarity', 'source_similarity_batch', 'lexical_similarity_batch', 'sentiment', 'scrape', 'fact_check', 'audit']
+SERVICES = ['similarity', 'sentiment', 'scrape', 'fact_check', 'audit']
+
+# Libraries that must only be imported once a model loads (in the background), never while a service starts up
+HEAVY_MODULES = ['torch', 'transformers', 'sentence_transformers', 'rouge_score', 'optimum']
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {service}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': round(seconds, 3), 'heavy_modules': [name for name in {heavy_modules!r} if name in sys.modules]}}))
+"""
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the audit microservices")
+    parser.add_argument('--endpoints', nargs='+', default=ENDPOINTS, choices=ENDPOINTS)
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 4, 8])
+    parser.add_argument('--requests', type=int, default=32, help="requests per endpoint per concurrency level")
+    parser.add_argument('--stub-models', action='store_true', help="use deterministic stub models (no weights needed)")
+    parser.add_argument('--no-cache', action='store_true', help="only measure cold (with every cache disabled), skipping the warm pass")
+    parser.add_argument('--qa-pairs', default=os.path.join(BENCHMARKS_DIR, 'qa_pairs.json'))
+    parser.add_argument('--thresholds', default=os.path.join(BENCHMARKS_DIR, 'thresholds.json'))
+    parser.add_argument('--output', help="write the JSON results here as well as to stdout")
+    return parser.parse_args()
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+# Sends every payload to the endpoint using the given number of concurrent clients
+def measure(app, path, payloads, concurrency):
+    def send(payload):
+        start = time.perf_counter()
+        response = app.test_client().post(path, json=payload)
+        # Drain streamed responses so their full cost is measured
+        response.get_data()
+        return time.perf_counter() - start, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(send, payloads))
+    wall_seconds = time.perf_counter() - start
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    return {
+        'requests': len(results),
+        'errors': sum(1 for _, status in results if status >= 400),
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3),
+        'throughput_rps': round(len(results) / wall_seconds, 3)
+    }
+
+# Imports a service in a fresh interpreter (a cold start), returning the import time and any heavy modules it loaded
+def measure_import(service):
+    probe = IMPORT_PROBE.format(service=service, heavy_modules=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', probe], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+# Every in-process cache that lets a repeated payload skip the model or network path, as functions that resize
+# it (0 turns it off) and return its previous size
+def cache_resizers():
+    import embeddings
+    import scrape
+    import sentiment
+    from model_registry import registry
+
+    tokenizer, _ = registry.get('rouge_scorer')
+    return [
+        embeddings.embedding_cache.resize,
+        embeddings.source_index.resize,
+        sentiment.sentiment_cache.resize,
+        scrape.page_fetcher.cache.resize,
+        tokenizer.resize
+    ]
+
+# Latency thresholds apply to the cold single-client level (or the lowest measured), throughput to the best cold level
+def check_thresholds(results, thresholds):
+    regressions = []
+
+    for endpoint, limits in thresholds.get('latency_ms', {}).items():
+        levels = results['endpoints'].get(endpoint, {}).get('cold')
+        if not levels:
+            continue
+        baseline = levels[str(min(int(level) for level in levels))]
+        for stat, limit in limits.items():
+            if baseline[f'{stat}_ms'] > limit:
+                regressions.append(f"{endpoint} {stat} {baseline[f'{stat}_ms']}ms > {limit}ms")
+
+    for endpoint, limit in thresholds.get('min_throughput_rps', {}).items():
+        levels = results['endpoints'].get(endpoint, {}).get('cold')
+        if levels:
+            best = max(level['throughput_rps'] for level in levels.values())
+            if best < limit:
+                regressions.append(f"{endpoint} throughput {best}rps < {limit}rps")
+
+    for endpoint, passes in results['endpoints'].items():
+        for cache_state, levels in passes.items():
+            for concurrency, level in levels.items():
+                if level['errors']:
+                    regressions.append(f"{endpoint} returned {level['errors']} errors at concurrency {concurrency} ({cache_state})")
+
+    if 'max_peak_rss_mb' in thresholds and results['peak_rss_mb'] > thresholds['max_peak_rss_mb']:
+        regressions.append(f"peak RSS {results['peak_rss_mb']}MB > {thresholds['max_peak_rss_mb']}MB")
+
+    for service, limit in thresholds.get('max_import_seconds', {}).items():
+        seconds = results['imports'].get(service, {}).get('seconds')
+        if seconds is not None and seconds > limit:
+            regressions.append(f"{service} import {seconds}s > {limit}s")
+
+    for service, measured in results['imports'].items():
+        if measured['heavy_modules']:
+            regressions.append(f"{service} imports {', '.join(measured['heavy_modules'])} at startup")
+
+    if 'max_model_load_seconds' in thresholds:
+        total_load = sum(seconds or 0 for seconds in results['model_load_seconds'].values())
+        if total_load > thresholds['max_model_load_seconds']:
+            regressions.append(f"model load {total_load:.1f}s > {thresholds['max_model_load_seconds']}s")
+
+    return regressions
+
+def main():
+    args = parse_args()
+
+    # Only ever use cached model weights, never the network
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+    # Persistent caches left by earlier runs would make the cold pass warm
+    os.environ['EMBEDDING_CACHE_DIR'] = ''
+    os.environ['SOURCE_INDEX_DIR'] = ''
+
+    # Cold start of each service, measured before anything is imported here
+    imports = {service: measure_import(service) for service in SERVICES}
+
+    import similarity
+    import sentiment
+    import scrape
+    import fact_check
+    import audit
+    from model_registry import registry
+    from inference_backend import model_backend
+
+    if args.stub_models:
+        from stub_models import install_stub_models
+        install_stub_models()
+
+    model_names = ['sentence_encoder', 'emotion_classifier', 'fact_check', 'ner', 'rouge_scorer']
+    registry.warm_up(model_names)
+    model_load_seconds = {name: status.get('load_seconds') for name, status in registry.status(model_names).items()}
+
+    from stub_server import start_stub_server, page_url
+    server = start_stub_server()
+
+    with open(args.qa_pairs) as f:
+        qa_pairs = json.load(f)
+
+    # Evidence for the fact check and source similarity payloads comes from scraping the synthetic pages once up front
+    summaries = []
+    for qa in qa_pairs:
+        answer_sentence, question_sentences = scrape.scrape_text(page_url(server, qa['pages'][0]), 2, qa['question'], qa['answer'])
+        summaries.append([sentence for _, sentence in question_sentences or []] + [answer_sentence or ""])
+
+    def payloads_for(endpoint):
+        for i in range(args.requests):
+            qa, summary = qa_pairs[i % len(qa_pairs)], summaries[i % len(qa_pairs)]
+            if endpoint in ('similarity', 'sentiment'):
+                yield {'question': qa['question'], 'answer': qa['answer']}
+            elif endpoint in ('source_similarity_batch', 'lexical_similarity_batch'):
+                yield {'user_qa_element': qa['answer'], 'sources': summary}
+            elif endpoint == 'scrape':
+                yield {'url': page_url(server, qa['pages'][0]), 'sentence_bound': 2, 'question': qa['question'], 'answer': qa['answer']}
+            elif endpoint == 'fact_check':
+                yield {'summary': summary, 'answer': qa['answer']}
+            elif endpoint == 'audit':
+                yield {'question': qa['question'], 'answer': qa['answer'], 'urls': [page_url(server, page) for page in qa['pages']]}
+
+    apps = {
+        'similarity': (similarity.app, '/similarity'),
+        'source_similarity_batch': (similarity.app, '/source_similarity_batch'),
+        'lexical_similarity_batch': (similarity.app, '/lexical_similarity_batch'),
+        'sentiment': (sentiment.app, '/sentiment'),
+        'scrape': (scrape.app, '/scrape'),
+        'fact_check': (fact_check.app, '/fact_check'),
+        'audit': (audit.app, '/audit')
+    }
+
+    results = {
+        'config': {
+            'stub_models': args.stub_models,
+            'no_cache': args.no_cache,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'qa_pairs': len(qa_pairs),
+            'backends': {name: model_backend(name) for name in model_names if name != 'rouge_scorer'}
+        },
+        'imports': imports,
+        'model_load_seconds': model_load_seconds,
+        'endpoints': {}
+    }
+
+    def measure_levels(endpoint):
+        app, path = apps[endpoint]
+        return {str(concurrency): measure(app, path, list(payloads_for(endpoint)), concurrency) for concurrency in args.concurrency}
+
+    # Cold: every cache off, so each request runs the models (and fetches its pages)
+    resizers = cache_resizers()
+    cache_sizes = [resize(0) for resize in resizers]
+    for endpoint in args.endpoints:
+        results['endpoints'][endpoint] = {'cold': measure_levels(endpoint)}
+
+    # Warm: the caches back on, filled by one unmeasured pass over the payloads first
+    if not args.no_cache:
+        for resize, size in zip(resizers, cache_sizes):
+            resize(size)
+        for endpoint in args.endpoints:
+            app, path = apps[endpoint]
+            measure(app, path, list(payloads_for(endpoint)), 1)
+            results['endpoints'][endpoint]['warm'] = measure_levels(endpoint)
+
+    server.shutdown()
+    scrape.page_fetcher.close()
+
+    # ru_maxrss is reported in kilobytes on Linux
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    thresholds = {}
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            thresholds = json.load(f)
+    results['regressions'] = check_thresholds(results, thresholds)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+
+    sys.exit(1 if results['regressions'] else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+# stub_server.py
+# Serves the synthetic HTML pages (generated filler, see bench_html_extract.py) over a local HTTP server so scraping
+# can be benchmarked offline and reproducibly.
+#
+# Usage (from backend/): python benchmarks/stub_server.py [--port 8765]
+import argparse
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'synthetic_pages')
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # Request logging would dominate the benchmark output
+    def log_message(self, format, *args):
+        pass
+
+
+# Starts the page server on a background thread and returns it (port 0 picks a free port, see server.server_port)
+def start_stub_server(port=0, pages_dir=PAGES_DIR):
+    handler = functools.partial(QuietHandler, directory=pages_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, name='stub-server', daemon=True).start()
+    return server
+
+# URL of a page on a running stub server
+def page_url(server, page):
+    return f"http://127.0.0.1:{server.server_port}/{page}"
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the synthetic benchmark pages")
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port)
+    print(f"Serving {PAGES_DIR} on http://127.0.0.1:{server.server_port}")
+    threading.Event().wait()
@@ -0,0 +1,190 @@
+# embedding_cache.py
+import atexit
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from lru_cache import LRUCache
+from mmap_store import MappedMatrix
+
+# Each row's key in the key log is its 64 hex digit hash plus a newline
+KEY_LINE_BYTES = 65
+
+
+# Content-addressed cache of sentence embeddings. Entries are keyed by the model name plus a hash of the
+# text, so the same answer scored against many sources (or the same popular article seen in many audits)
+# is only encoded once. A bounded in-memory LRU tier sits in front of an optional memory-mapped on-disk
+# tier that survives restarts.
+#
+# The disk tier is a float32 matrix plus an append-only key log (row i holds the embedding of the key on line i)
+# and can be shared by every service and worker process pointed at the same directory: rows are appended under
+# an exclusive file lock, after reading any rows other processes appended since, and lookups that miss pick up
+# those rows too. Rows are written before their keys, so the log never names a row that has not been written.
+class EmbeddingCache:
+    def __init__(self, model_name, max_entries=10000, disk_dir=None):
+        self.model_name = model_name
+        self._memory = LRUCache(max_entries)
+        self._disk_dir = disk_dir
+        self._disk_lock = threading.Lock()
+        self._disk_matrix = None
+        self._disk_rows = {}
+        self._disk_keys_read = 0
+        self._disk_read_only = False
+        self.disk_hits = 0
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            with self._disk_lock, self._file_lock(fcntl.LOCK_SH):
+                self._read_new_rows_locked()
+            atexit.register(self.flush)
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode('utf-8')).hexdigest()
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self._disk_dir, 'meta.json')
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self._disk_dir, 'keys.log')
+
+    @property
+    def _matrix_path(self):
+        return os.path.join(self._disk_dir, 'embeddings.f32')
+
+    # Locks the disk tier against other processes. The lock file is opened on every use (flock locks belong to the
+    # open file, so one opened before a fork would be shared by the parent and child rather than exclude them)
+    @contextlib.contextmanager
+    def _file_lock(self, operation=fcntl.LOCK_EX):
+        with open(os.path.join(self._disk_dir, 'lock'), 'a') as f:
+            fcntl.flock(f, operation)
+            yield
+
+    # Reads the rows appended to the key log since it was last read (by this or any other process)
+    def _read_new_rows_locked(self):
+        if self._disk_matrix is None:
+            if not os.path.exists(self._meta_path):
+                return
+            with open(self._meta_path) as f:
+                self._disk_matrix = MappedMatrix(self._matrix_path, json.load(f)['dim'])
+
+        with open(self._keys_path, 'ab+') as f:
+            f.seek(self._disk_keys_read)
+            data = f.read()
+        data = data[:len(data) - len(data) % KEY_LINE_BYTES]
+
+        row = self._disk_keys_read // KEY_LINE_BYTES
+        for line in data.splitlines():
+            self._disk_rows.setdefault(line.decode('ascii'), row)
+            row += 1
+        self._disk_keys_read += len(data)
+        self._disk_matrix.reserve(row)
+
+    # Returns a list with the cached embedding for each text, or None where it is not cached
+    def get_many(self, texts):
+        keys = [self.key(text) for text in texts]
+        vectors = [self._memory.get(key) for key in keys]
+
+        if self._disk_dir and any(vector is None for vector in vectors):
+            with self._disk_lock:
+                # Rows other processes have appended since the key log was last read can answer these misses too
+                if os.path.exists(self._keys_path) and os.path.getsize(self._keys_path) > self._disk_keys_read:
+                    with self._file_lock(fcntl.LOCK_SH):
+                        self._read_new_rows_locked()
+
+                for i, key in enumerate(keys):
+                    row = self._disk_rows.get(key) if vectors[i] is None else None
+                    if row is not None:
+                        vectors[i] = self._disk_matrix.read(row)
+                        self.disk_hits += 1
+                        # Promote to the memory tier so the next lookup skips the disk
+                        self._memory.put(key, vectors[i])
+
+        return vectors
+
+    # Resizes the memory tier (0 turns it off), returning its previous size
+    def resize(self, max_entries):
+        return self._memory.resize(max_entries)
+
+    def put_many(self, texts, vectors):
+        new_rows = []
+        for text, vector in zip(texts, vectors):
+            key = self.key(text)
+            vector = np.asarray(vector, dtype=np.float32)
+            self._memory.put(key, vector)
+            new_rows.append((key, vector))
+
+        if self._disk_dir and new_rows:
+            self._write_disk_rows(new_rows)
+
+    def _write_disk_rows(self, new_rows):
+        with self._disk_lock:
+            if self._disk_read_only:
+                return
+
+            with self._file_lock():
+                # New rows go after every row written so far, including those of other processes
+                self._read_new_rows_locked()
+                new_rows = list({key: vector for key, vector in new_rows if key not in self._disk_rows}.items())
+                if not new_rows:
+                    return
+
+                dim = new_rows[0][1].shape[-1]
+                if self._disk_matrix is None:
+                    self._disk_matrix = MappedMatrix(self._matrix_path, dim)
+                    with open(self._meta_path + '.tmp', 'w') as f:
+                        json.dump({'dim': dim}, f)
+                    os.replace(self._meta_path + '.tmp', self._meta_path)
+                elif self._disk_matrix.dim != dim:
+                    print(f"Embedding cache {self._disk_dir} holds {self._disk_matrix.dim} dimension embeddings, not {dim}: not writing to it")
+                    self._disk_read_only = True
+                    return
+
+                start = self._disk_keys_read // KEY_LINE_BYTES
+                self._disk_matrix.write(start, np.stack([vector for _, vector in new_rows]))
+
+                keys = ''.join(f"{key}\n" for key, _ in new_rows).encode('ascii')
+                with open(self._keys_path, 'ab') as f:
+                    # Drops a partial line left by a process that died while appending, so every key stays on its row
+                    f.truncate(self._disk_keys_read)
+                    f.write(keys)
+                for offset, (key, _) in enumerate(new_rows):
+                    self._disk_rows[key] = start + offset
+                self._disk_keys_read += len(keys)
+
+    # Writes the disk tier's rows back to the file (other processes already see them through the page cache)
+    def flush(self):
+        if not self._disk_dir:
+            return
+        with self._disk_lock:
+            if self._disk_matrix is not None:
+                self._disk_matrix.flush()
+
+    # Hit-rate and memory metrics for both tiers
+    def stats(self):
+        memory_stats = self._memory.stats()
+        memory_stats['bytes'] = sum(vector.nbytes for vector in self._memory.values())
+
+        # A memory miss can still be a disk hit, so the overall hit rate counts both tiers
+        lookups = memory_stats['hits'] + memory_stats['misses']
+        hits = memory_stats['hits'] + self.disk_hits
+
+        stats = {
+            'model': self.model_name,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'memory': memory_stats
+        }
+        if self._disk_dir:
+            stats['disk'] = {
+                'path': self._disk_dir,
+                'entries': len(self._disk_rows),
+                'hits': self.disk_hits,
+                'bytes': self._disk_matrix.nbytes if self._disk_matrix is not None else 0
+            }
+        return stats
@@ -0,0 +1,113 @@
+# embeddings.py
+from model_registry import registry
+from inference_backend import model_backend, load_sentence_transformer
+from embedding_cache import EmbeddingCache
+from source_index import SourceIndex
+from batching import MicroBatcher
+from instrumentation import span
+import numpy as np
+import os
+
+# Choose a sentence transformer model built on top of BERT for
+# better semantic understanding to compare sentence similarity
+EMBEDDING_MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+
+# Runs with the backend set by SENTENCE_ENCODER_BACKEND / INFERENCE_BACKEND (see inference_backend.py)
+def load_sentence_encoder():
+    return load_sentence_transformer(EMBEDDING_MODEL_NAME, model_backend('sentence_encoder'))
+
+# Shared by the similarity, scrape and fact check services so each can score sentences in-process
+# (one model per process) rather than making an HTTP round-trip to the similarity microservice per sentence
+registry.register('sentence_encoder', load_sentence_encoder)
+
+# Cached and indexed embeddings are keyed by the model and the backend that produced them, so switching
+# SENTENCE_ENCODER_BACKEND (eg to onnx-int8) never serves another backend's slightly different vectors
+EMBEDDING_MODEL_KEY = f"{EMBEDDING_MODEL_NAME}@{model_backend('sentence_encoder')}"
+
+# Runs one coalesced batch of sentences (possibly from several concurrent requests) through the model
+def encode_batch(sentences):
+    model = registry.get('sentence_encoder')
+    with registry.inference_lock('sentence_encoder'):
+        return list(model.encode(sentences))
+
+encoder_batcher = MicroBatcher('sentence_encoder', encode_batch, max_batch_size=int(os.environ.get('ENCODER_BATCH_SIZE', 64)))
+
+def get_embedding(sentence):
+    return get_embeddings([sentence])[0]
+
+# Identical strings are constantly re-embedded (the same answer against many sources, the same popular
+# articles across audits), so embeddings are cached in memory (EMBEDDING_CACHE_SIZE entries) and optionally
+# persisted to EMBEDDING_CACHE_DIR so the cache survives restarts (every service and worker can share one directory)
+embedding_cache = EmbeddingCache(
+    EMBEDDING_MODEL_KEY,
+    max_entries=int(os.environ.get('EMBEDDING_CACHE_SIZE', 10000)),
+    disk_dir=os.environ.get('EMBEDDING_CACHE_DIR') or None
+)
+
+# Paragraphs and unit-length embeddings of recently scraped sources (see source_index.py), so a repeat source is
+# scored without being fetched, parsed or encoded again. Set SOURCE_INDEX_DIR to keep the index across restarts and
+# SOURCE_INDEX_MAX_SOURCES=0 to turn it off. Only one service process can own the directory (the first to start;
+# any other falls back to a private index), so set it for the service that scrapes (scrape or audit) only
+source_index = SourceIndex(
+    EMBEDDING_MODEL_KEY,
+    directory=os.environ.get('SOURCE_INDEX_DIR') or None,
+    ttl=int(os.environ.get('SOURCE_INDEX_TTL', 86400)),
+    max_sources=int(os.environ.get('SOURCE_INDEX_MAX_SOURCES', 1000))
+)
+
+# Encodes a list of sentences, running only the ones missing from the cache through the model (via the shared batcher)
+def get_embeddings(sentences):
+    sentences = list(sentences)
+    vectors = embedding_cache.get_many(sentences)
+
+    # Encode each distinct missing sentence once, even if it appears several times in the list
+    missing_sentences = list(dict.fromkeys(sentence for sentence, vector in zip(sentences, vectors) if vector is None))
+    if missing_sentences:
+        with span('encode'):
+            missing_vectors = encoder_batcher.run_many(missing_sentences)
+        embedding_cache.put_many(missing_sentences, missing_vectors)
+
+        encoded = dict(zip(missing_sentences, missing_vectors))
+        vectors = [encoded[sentence] if vector is None else vector for sentence, vector in zip(sentences, vectors)]
+
+    if not vectors:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack(vectors)
+
+def cosine_similarity(vec_a, vec_b):
+    # Reshape the vectors to be 1D arrays
+    vec_a = vec_a.flatten()
+    vec_b = vec_b.flatten()
+
+    # Compute the dot product
+    dot_product = np.dot(vec_a, vec_b)
+
+    # Compute the norms
+    norm_a = np.linalg.norm(vec_a)
+    norm_b = np.linalg.norm(vec_b)
+
+    # Compute and return cosine similarity
+    return dot_product / (norm_a * norm_b)
+
+# Scales each embedding (row) to unit length so cosine similarity becomes a plain dot product
+def normalize_embeddings(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+# Indices of the k highest scores, highest first (argpartition avoids sorting every score)
+def top_k_indices(scores, k):
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top_indices = np.argpartition(-scores, k - 1)[:k]
+    return top_indices[np.argsort(-scores[top_indices], kind='stable')].tolist()
+
+# Cosine similarity of one QA element (question or answer) against every source sentence, computed from a
+# single batched encode (the QA element and all sources together) and returned as floats in source order
+def source_similarities(user_qa_element, sources):
+    if not sources:
+        return []
+
+    vectors = normalize_embeddings(get_embeddings([user_qa_element] + list(sources)))
+    return (vectors[1:] @ vectors[0]).tolist()
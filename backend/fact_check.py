@@ -1,39 +1,110 @@
 from flask import Flask, request, jsonify
-from transformers import pipeline, AutoTokenizer, AutoModelForTokenClassification
-from transformers import RobertaTokenizer, RobertaForSequenceClassification
 from flask_cors import CORS
-import requests
-import torch
+from model_registry import registry, register_health_routes
+from inference_backend import model_backend, load_classifier
+from embeddings import source_similarities, top_k_indices, encoder_batcher, get_embeddings, normalize_embeddings, source_index
+from sentences import prepare_evidence_sentences
+from batching import MicroBatcher, register_batching_routes
+import instrumentation
+from instrumentation import span
+import numpy as np
+import os
 
 app = Flask(__name__)
 # Remedy CORS errors and related CORS shennanigans
 CORS(app)
 
-@app.route('/fact_check', methods=['POST'])
-def fact_check_answer():
-    data = request.get_json()
-    
-    # Load the summary (related snippets from user's selected source article) and the answer (being audited to check for misinformation)
-    summary = data.get("summary", "")
-    answer = data.get("answer", "")
+# Load the tokenizer and misinformation (fact-check based on claim,evidence) model 
+# Source: https://huggingface.co/Dzeniks/roberta-fact-check
+# (run with the backend set by FACT_CHECK_BACKEND / INFERENCE_BACKEND, see inference_backend.py)
+def load_fact_check_model():
+    from transformers import RobertaTokenizer
+    return load_classifier('Dzeniks/roberta-fact-check', 'sequence-classification', model_backend('fact_check'), tokenizer_class=RobertaTokenizer)
 
-    # Ensure that both summary sentences (of source) and answer are in proper form
-    if (not isinstance(answer, str)):
-        raise ValueError("answer must be of type: str")
-    elif not isinstance(summary, list) or not all(isinstance(item, str) for item in summary):
-        raise ValueError("summary must be of type: list of strings (string[])")
-    
-    # Load the tokenizer and misinformation (fact-check based on claim,evidence) model 
-    # Source: https://huggingface.co/Dzeniks/roberta-fact-check
-    tokenizer = RobertaTokenizer.from_pretrained('Dzeniks/roberta-fact-check')
-    model = RobertaForSequenceClassification.from_pretrained('Dzeniks/roberta-fact-check')
-
-    # Load the Named-Entity-Recognition model (NER) to extract important entities (topics) from both answer and sources
-    # Source: https://huggingface.co/dslim/bert-base-NER
-    ner_tokenizer = AutoTokenizer.from_pretrained("dslim/bert-base-NER")
-    ner_model = AutoModelForTokenClassification.from_pretrained("dslim/bert-base-NER")
-    ner = pipeline("ner", model=ner_model, tokenizer=ner_tokenizer)
-    ner_answer = ner(answer)
+# Load the Named-Entity-Recognition model (NER) to extract important entities (topics) from both answer and sources
+# Source: https://huggingface.co/dslim/bert-base-NER
+# (run with the backend set by NER_BACKEND / INFERENCE_BACKEND)
+def load_ner_pipeline():
+    from transformers import pipeline
+    ner_tokenizer, ner_model = load_classifier("dslim/bert-base-NER", 'token-classification', model_backend('ner'))
+    return pipeline("ner", model=ner_model, tokenizer=ner_tokenizer)
+
+# Models are loaded once per process (not per request) and shared across requests through the registry
+FACT_CHECK_MODELS = ['fact_check', 'ner', 'sentence_encoder']
+registry.register('fact_check', load_fact_check_model)
+registry.register('ner', load_ner_pipeline)
+register_health_routes(app, FACT_CHECK_MODELS)
+
+# Maximum sentences per forward pass for the claim-evidence model and the NER model (tune to the host's CPU / memory)
+FACT_CHECK_BATCH_SIZE = int(os.environ.get('FACT_CHECK_BATCH_SIZE', 16))
+NER_BATCH_SIZE = int(os.environ.get('NER_BATCH_SIZE', 16))
+
+# Runs one coalesced batch of (answer, sentence) pairs, possibly from several concurrent requests, through the
+# claim-evidence model in a single forward pass, returning the two logits for each pair
+def score_claim_batch(pairs):
+    import torch
+    tokenizer, model = registry.get('fact_check')
+
+    # Tokenize each claim with its evidence, padding the pairs to a common length (the attention mask
+    # keeps padding from changing the logits) and truncating only pairs that would overflow the model anyway
+    x = tokenizer([claim for claim, _ in pairs], [evidence for _, evidence in pairs], padding=True, truncation=True, return_tensors="pt")
+
+    with registry.inference_lock('fact_check'), torch.no_grad():
+        prediction = model(**x)
+
+    return prediction.logits.tolist()
+
+# Runs one coalesced batch of texts through the NER model
+def ner_batch(texts):
+    ner = registry.get('ner')
+    with registry.inference_lock('ner'):
+        return ner(texts, batch_size=NER_BATCH_SIZE)
+
+# Concurrent fact checks share forward passes: each batcher gathers pairs / texts from every in-flight request
+claim_batcher = MicroBatcher('fact_check', score_claim_batch, max_batch_size=FACT_CHECK_BATCH_SIZE)
+ner_batcher = MicroBatcher('ner', ner_batch, max_batch_size=NER_BATCH_SIZE)
+register_batching_routes(app, [claim_batcher, ner_batcher, encoder_batcher])
+instrumentation.init_app(app, 'fact_check', [claim_batcher, ner_batcher, encoder_batcher])
+
+# When set, only this many evidence sentences (the most similar to the answer) are run through the claim-evidence model
+FACT_CHECK_TOP_N = int(os.environ.get('FACT_CHECK_TOP_N', 0))
+# Passages taken from the source index when a fact check names the source url it was summarized from
+FACT_CHECK_SOURCE_PASSAGES = int(os.environ.get('FACT_CHECK_SOURCE_PASSAGES', 3))
+
+# Scores the answer (claim) against every sentence (evidence), returning the two logits for each sentence in order
+def score_claims(answer, sentences):
+    # Initialize tokenizer, and also assert the "evidence" to be the summary (ie use the information in the source the
+    # user chose as the ground truth), and use the answer from the LLM (or AI agent) as the "claim" in this case, which is 
+    # to be evaluated using the scraped content from the user's source. 
+    with span('claim_evidence'):
+        return claim_batcher.run_many([(answer, sentence) for sentence in sentences])
+
+# Runs NER over a list of texts in batches, returning the list of entities found for each text
+def extract_entities(texts):
+    with span('ner'):
+        return ner_batcher.run_many(texts)
+
+# The passages of an indexed source most similar to the answer (the source's embeddings come from the index, so
+# only the answer is encoded), or an empty list if the source has not been scraped recently
+def indexed_evidence(url, answer, k=FACT_CHECK_SOURCE_PASSAGES):
+    with span('retrieve'):
+        passages = source_index.get(url)
+        if passages is None or not passages[0]:
+            return []
+        p_texts, p_vectors = passages
+        answer_vector = normalize_embeddings(get_embeddings([answer]))[0]
+        return [p_texts[i] for i in top_k_indices(p_vectors @ answer_vector, k)]
+
+# Decides whether the source summary supports the answer, returning the decision and the supporting sentences
+# (used by the /fact_check route and in-process by the audit pipeline). Given the source url, the summary is
+# extended with the source's passages most relevant to the answer from this process's source index, so this only
+# adds evidence in-process, after the same process has scraped the source (as the audit pipeline does)
+def fact_check(summary, answer, top_n=FACT_CHECK_TOP_N, url=None):
+    if url:
+        summary = list(summary) + indexed_evidence(url, answer)
+
+    # Extract the Named-Entity-Recognition (NER) for the answer using the shared (already loaded) NER model
+    ner_answer = extract_entities([answer])[0]
     # Create a list of the NER determined words present in the answer 
     ner_answer_words = [item['word'] for item in ner_answer]
 
@@ -44,84 +115,89 @@ def fact_check_answer():
     # Create a set of supporting sentences (ie distinct) to be used as evidence in favor of supporting the answer
     supporting_set = set()
 
-    for evidence in summary:
-        # Break each evidence paragraph inside the source summary into individual sentences
-        evidence_sentences = evidence.split(".")
-        
-        for sentence in evidence_sentences:
-            # Tokenize the claim with evidence (indivual sentence from most similar portions of user's selected source to QA pair)
-            x = tokenizer.encode_plus(answer, sentence, return_tensors="pt")
-            
-            # Initialize tokenizer, and also assert the "evidence" to be the summary (ie use the information in the source the
-            # user chose as the ground truth), and use the answer from the LLM (or AI agent) as the "claim" in this case, which is 
-            # to be evaluated using the scraped content from the user's source. 
-            model.eval()
-            with torch.no_grad():
-                prediction = model(**x)
-
-            # Receive the label from the Misinformation model being used
-            label = torch.argmax(prediction[0]).item()
-            logits = prediction.logits  # Extract the logits tensor
-            value_1, value_2 = logits.squeeze().tolist()  # Convert to list and unpack
-
-            # If label says that the sentence supports answer, and logits confer (not arbitrary values, tested on robust amount of QA topics)
-            if (label == 0 and value_1 >= -0.2 and value_2 < 0.805):
-                # Ensure the sentence is unique (not part of our current set of evidence)
-                if not sentence in supporting_set:
-                    supporting_set.add(sentence)
-
-                    # Extract the Named-Entity-Recognition (NER) for the sentence
-                    ner_sentence = ner(sentence)
-                    ner_sentence_words = [item['word'] for item in ner_sentence]
-                    
-                    # Prepare data for determining sentence similarity to answer and source via my microservice
-                    similarity_question_payload = {
-                        'user_qa_element': answer,
-                        'source': sentence
-                    }
-                    
-                    try:
-                        # Send POST request to my similarity microservice
-                        similarity_response = requests.post(
-                            'http://localhost:5002/source_similarity',
-                            json=similarity_question_payload
-                        )
-                        
-                        # Parse the JSON response
-                        similarity_data = similarity_response.json()
-                        similarity_score = similarity_data.get('similarityScore')
-
-                        # Ensure the similarity score between the sentence and answer is on track (since the
-                        # Misinformation model that we are using is not reliable all the time, we need to perform
-                        # a few extra checks to determine if it actually supports the answer or not)
-                        # Note: the specific values have been calibrated by debugging and exmaining thresholds
-                        # to perform robustly across different QA pair topics and categories, and reflect these findings (not arbitrary)
-                        if (similarity_score > 0.575):
-                            # Opportunity to earn extra majority votes for the source (to determine
-                            # if the source supports the answer) if:
-                            #   1: NER sentence words match at least one of the words in the NER answer words
-                            #   2: The similarity score between the sentence and the answer are very high
-                            if len(ner_sentence_words) > 0:
-                                words_found = 0
-                                for word in ner_sentence_words:
-                                    if word in ner_answer_words:
-                                        words_found += 1
-                                if words_found > (0):
-                                    #  Earn a bonus point for NER category
-                                    majorityVoteSupport += 1
-                            if (similarity_score > 0.77):
-                                # Earn a bonus point for high sentence-answer similarity score
-                                majorityVoteSupport += 1
-                                
-                            majorityVoteSupport += 1
-                    
-                    except requests.exceptions.RequestException as e:
-                        print(f"Error calculating similarity between source data and answer")
+    # Break each evidence paragraph inside the source summary into individual sentences, dropping empty / trivially
+    # short fragments and duplicates before any model call so cost scales with the number of useful sentences
+    with span('segment'):
+        evidence_sentences = prepare_evidence_sentences(summary)
+
+    # Optionally only send the top_n sentences most similar to the answer to the (expensive) claim-evidence model
+    # (their embeddings are cached, so the similarity check on accepted sentences below does not re-encode them)
+    if top_n and len(evidence_sentences) > top_n:
+        answer_similarities = np.array(source_similarities(answer, evidence_sentences))
+        evidence_sentences = [evidence_sentences[i] for i in sorted(top_k_indices(answer_similarities, top_n))]
+
+    # Score every (answer, sentence) pair in padded mini-batches rather than one forward pass per sentence
+    claim_logits = score_claims(answer, evidence_sentences)
+
+    # Collect the distinct sentences that the misinformation model says support the answer (in source order)
+    accepted_sentences = []
+    for sentence, (value_1, value_2) in zip(evidence_sentences, claim_logits):
+        # Receive the label from the Misinformation model being used (argmax of the two logits, ties go to label 0)
+        label = 0 if value_1 >= value_2 else 1
+
+        # If label says that the sentence supports answer, and logits confer (not arbitrary values, tested on robust amount of QA topics)
+        if (label == 0 and value_1 >= -0.2 and value_2 < 0.805):
+            # Ensure the sentence is unique (not part of our current set of evidence)
+            if not sentence in supporting_set:
+                supporting_set.add(sentence)
+                accepted_sentences.append(sentence)
+
+    # Extract the Named-Entity-Recognition (NER) for all accepted sentences in one batched call
+    ner_sentences = extract_entities(accepted_sentences)
+
+    # Determine each accepted sentence's similarity to the answer in-process (one batched encode for all sentences)
+    similarity_scores = source_similarities(answer, accepted_sentences)
+
+    for ner_sentence, similarity_score in zip(ner_sentences, similarity_scores):
+        ner_sentence_words = [item['word'] for item in ner_sentence]
+
+        # Ensure the similarity score between the sentence and answer is on track (since the
+        # Misinformation model that we are using is not reliable all the time, we need to perform
+        # a few extra checks to determine if it actually supports the answer or not)
+        # Note: the specific values have been calibrated by debugging and exmaining thresholds
+        # to perform robustly across different QA pair topics and categories, and reflect these findings (not arbitrary)
+        if (similarity_score > 0.575):
+            # Opportunity to earn extra majority votes for the source (to determine
+            # if the source supports the answer) if:
+            #   1: NER sentence words match at least one of the words in the NER answer words
+            #   2: The similarity score between the sentence and the answer are very high
+            if len(ner_sentence_words) > 0:
+                words_found = 0
+                for word in ner_sentence_words:
+                    if word in ner_answer_words:
+                        words_found += 1
+                if words_found > (0):
+                    #  Earn a bonus point for NER category
+                    majorityVoteSupport += 1
+            if (similarity_score > 0.77):
+                # Earn a bonus point for high sentence-answer similarity score
+                majorityVoteSupport += 1
+                
+            majorityVoteSupport += 1
     # At least 2 points need to be earned to support (so not a repeated piece of evidence, unless that 
     # evidence is extremely compelling), ideally a combination of distinct sentences and compelling sentences
     answerSupported = majorityVoteSupport >= 2
     # Convert supporting set of sentences back into a list to render to the user
-    supporting_set = list(supporting_set)
+    return answerSupported, list(supporting_set)
+
+@app.route('/fact_check', methods=['POST'])
+def fact_check_answer():
+    data = request.get_json()
+    
+    # Load the summary (related snippets from user's selected source article) and the answer (being audited to check for misinformation)
+    summary = data.get("summary", "")
+    answer = data.get("answer", "")
+    top_n = data.get("top_n", FACT_CHECK_TOP_N)
+
+    # Ensure that both summary sentences (of source) and answer are in proper form
+    if (not isinstance(answer, str)):
+        raise ValueError("answer must be of type: str")
+    elif not isinstance(summary, list) or not all(isinstance(item, str) for item in summary):
+        raise ValueError("summary must be of type: list of strings (string[])")
+    elif not isinstance(top_n, int) or isinstance(top_n, bool) or top_n < 0:
+        raise ValueError("top_n must be a non-negative integer")
+    
+    answerSupported, supporting_set = fact_check(summary, answer, top_n)
 
     return jsonify({
         'message': 'Answer Successfully Fact Checked Using Source',
@@ -132,4 +208,7 @@ def fact_check_answer():
     })
 
 if __name__ == '__main__':
+    # Warm the models in the background while the server starts, so the first audit measures inference and not
+    # disk I/O (/ready reports when they are loaded)
+    registry.start_warm_up(FACT_CHECK_MODELS)
     app.run(port=5005)
\ No newline at end of file
@@ -0,0 +1,153 @@
+# fetcher.py
+import asyncio
+import os
+import queue
+import threading
+import time
+
+import aiohttp
+
+from lru_cache import LRUCache
+
+# Simulates being a web user (at a very low level) but could bypass simple attempts to prevent web scrapers
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+}
+
+
+# Raised when a page could not be fetched (connection error, timeout or bad status code)
+class FetchError(Exception):
+    pass
+
+
+# TTL-bounded cache of fetched pages. Expired pages are kept (up to max_entries) along with their
+# ETag / Last-Modified validators so they can be revalidated with a cheap conditional request
+class PageCache:
+    def __init__(self, max_entries=256, ttl=300):
+        self.ttl = ttl
+        self._pages = LRUCache(max_entries)
+
+    def get(self, url):
+        return self._pages.get(url)
+
+    def is_fresh(self, page):
+        return time.monotonic() - page['fetched_at'] < self.ttl
+
+    def put(self, url, text, etag=None, last_modified=None):
+        self._pages.put(url, {
+            'text': text,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.monotonic()
+        })
+
+    # Marks a cached page as fresh again (after the server answered 304 Not Modified)
+    def touch(self, url, page):
+        self._pages.put(url, dict(page, fetched_at=time.monotonic()))
+
+    # Resizes the cache (0 turns it off), returning its previous size
+    def resize(self, max_entries):
+        return self._pages.resize(max_entries)
+
+    def stats(self):
+        return self._pages.stats()
+
+
+# Fetches pages concurrently through one pooled aiohttp session running on a background event loop, so
+# Flask request threads can fetch many sources at once without each paying for a fresh TCP/TLS connection.
+# The connector caps total and per-host concurrency so a batch of URLs on one site does not hammer it.
+class PageFetcher:
+    def __init__(self, timeout=3, total_timeout=10, max_connections=32, per_host_limit=4, cache=None):
+        self.timeout = timeout
+        self.total_timeout = total_timeout
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.cache = cache if cache is not None else PageCache()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._session = None
+        self._pid = None
+
+    # Starts the background event loop on first use (and again in a forked worker, since threads do not survive a fork)
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._session = None
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name='page-fetcher', daemon=True).start()
+            return self._loop
+
+    # The session (and its connection pool) must be created on the event loop that uses it
+    async def _get_session(self):
+        if self._session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.per_host_limit)
+            # The connect and read timeouts bound each stall, the total bounds a server trickling the page out slowly
+            timeout = aiohttp.ClientTimeout(total=self.total_timeout, sock_connect=self.timeout, sock_read=self.timeout)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=DEFAULT_HEADERS)
+        return self._session
+
+    async def _fetch(self, url):
+        page = self.cache.get(url)
+        if page is not None and self.cache.is_fresh(page):
+            return page['text']
+
+        # Revalidate an expired cached page instead of downloading it again when the server supports it
+        headers = {}
+        if page is not None:
+            if page['etag']:
+                headers['If-None-Match'] = page['etag']
+            if page['last_modified']:
+                headers['If-Modified-Since'] = page['last_modified']
+
+        session = await self._get_session()
+        try:
+            async with session.get(url, headers=headers, allow_redirects=True) as response:
+                if response.status == 304 and page is not None:
+                    self.cache.touch(url, page)
+                    return page['text']
+
+                response.raise_for_status()  # Raise an error for bad status codes
+                text = await response.text(errors='replace')
+                self.cache.put(url, text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                return text
+        except asyncio.TimeoutError as e:
+            raise FetchError(f"{url}: timed out") from e
+        except (aiohttp.ClientError, ValueError) as e:
+            raise FetchError(f"{url}: {e}") from e
+
+    # Fetches a single page, blocking the calling thread until it arrives
+    def fetch(self, url):
+        return asyncio.run_coroutine_threadsafe(self._fetch(url), self._ensure_loop()).result()
+
+    # Fetches all pages concurrently, yielding (url, text) as each one finishes (text is a FetchError on failure)
+    def fetch_many(self, urls):
+        loop = self._ensure_loop()
+        finished = queue.Queue()
+
+        for url in urls:
+            future = asyncio.run_coroutine_threadsafe(self._fetch(url), loop)
+            future.add_done_callback(lambda future, url=url: finished.put((url, future)))
+
+        for _ in urls:
+            url, future = finished.get()
+            try:
+                result = future.result()
+            except FetchError as e:
+                result = e
+            yield url, result
+
+    # Closes pooled connections and stops the event loop (used on graceful shutdown)
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None or self._pid != os.getpid():
+            return
+
+        async def close_session():
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+
+        asyncio.run_coroutine_threadsafe(close_session(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
@@ -0,0 +1,117 @@
+# html_extract.py
+from html.parser import HTMLParser
+
+# Sections of a page that are navigation / chrome rather than article content (p-tags inside them are skipped)
+BOILERPLATE_TAGS = {'nav', 'aside', 'script', 'style', 'noscript', 'template'}
+# Only skipped as the page's own header / footer: inside an article, section or main element they hold content
+# (eg an article's standfirst or byline)
+PAGE_CHROME_TAGS = {'header', 'footer'}
+SECTIONING_TAGS = {'article', 'section', 'main'}
+
+# Block-level tags that implicitly end an open p-tag when they start (as browsers do)
+BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'table', 'ul', 'ol', 'dl', 'pre', 'blockquote',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'figure', 'fieldset', 'form'
+} | BOILERPLATE_TAGS | PAGE_CHROME_TAGS
+# Block tags that wrap content (p-tags end themselves, hr has no end tag), counted to know when a block that
+# interrupted a p-tag has ended
+CONTAINER_TAGS = BLOCK_TAGS - {'p', 'hr'}
+
+# Size of each piece of the document handed to the parser (parsing stops between pieces once the budget is hit)
+CHUNK_SIZE = 16384
+
+
+# Raised internally to abandon parsing once enough paragraphs have been collected
+class _BudgetReached(Exception):
+    pass
+
+
+# Streaming p-tag text extractor. Unlike BeautifulSoup it does not build a tree of the whole document:
+# it only keeps the text of the current p-tag, and stops reading the page as soon as max_paragraphs
+# paragraphs have been found
+class ParagraphExtractor(HTMLParser):
+    def __init__(self, max_paragraphs=None):
+        super().__init__(convert_charrefs=True)
+        self.max_paragraphs = max_paragraphs
+        self.paragraphs = []
+        self._boilerplate_depth = 0
+        self._sectioning_depth = 0
+        # Whether each open header / footer tag was skipped as page chrome
+        self._chrome_stack = []
+        self._container_depth = 0
+        # Container depth at which the text of a p-tag interrupted by a block resumes, once that block ends
+        self._resume_depth = None
+        self._paragraph_parts = None
+        self._resumed = False
+
+    def _end_paragraph(self):
+        if self._paragraph_parts is not None:
+            text = "".join(self._paragraph_parts)
+            resumed = self._resumed
+            self._paragraph_parts = None
+            self._resumed = False
+            # The tail of an interrupted p-tag only counts if it has any text
+            if resumed and not text.strip():
+                return
+            self.paragraphs.append(text)
+            if self.max_paragraphs is not None and len(self.paragraphs) >= self.max_paragraphs:
+                raise _BudgetReached()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in BLOCK_TAGS:
+            # A block inside a p-tag ends it (as browsers do), but the p-tag's text after the block is kept
+            if tag == 'p':
+                self._resume_depth = None
+            elif self._paragraph_parts is not None:
+                self._resume_depth = self._container_depth
+            self._end_paragraph()
+        if tag in CONTAINER_TAGS:
+            self._container_depth += 1
+
+        if tag in SECTIONING_TAGS:
+            self._sectioning_depth += 1
+        if tag in PAGE_CHROME_TAGS:
+            self._chrome_stack.append(self._sectioning_depth == 0)
+
+        if tag in BOILERPLATE_TAGS or (tag in PAGE_CHROME_TAGS and self._chrome_stack[-1]):
+            self._boilerplate_depth += 1
+        elif tag == 'p' and self._boilerplate_depth == 0:
+            self._paragraph_parts = []
+
+    def handle_endtag(self, tag):
+        if tag in BOILERPLATE_TAGS or (tag in PAGE_CHROME_TAGS and self._chrome_stack and self._chrome_stack[-1]):
+            self._boilerplate_depth = max(0, self._boilerplate_depth - 1)
+        elif tag == 'p' or tag in BLOCK_TAGS:
+            self._end_paragraph()
+
+        if tag in PAGE_CHROME_TAGS and self._chrome_stack:
+            self._chrome_stack.pop()
+        if tag in SECTIONING_TAGS:
+            self._sectioning_depth = max(0, self._sectioning_depth - 1)
+
+        if tag == 'p':
+            self._resume_depth = None
+        elif tag in CONTAINER_TAGS:
+            self._container_depth = max(0, self._container_depth - 1)
+            if self._container_depth == self._resume_depth:
+                self._resume_depth = None
+                if self._boilerplate_depth == 0:
+                    self._paragraph_parts = []
+                    self._resumed = True
+
+    def handle_data(self, data):
+        if self._paragraph_parts is not None and self._boilerplate_depth == 0:
+            self._paragraph_parts.append(data)
+
+
+# Returns the text of the page's content p-tags (in document order), stopping once max_paragraphs are found
+def extract_paragraphs(html, max_paragraphs=None):
+    extractor = ParagraphExtractor(max_paragraphs)
+    try:
+        for start in range(0, len(html), CHUNK_SIZE):
+            extractor.feed(html[start:start + CHUNK_SIZE])
+        extractor.close()
+        extractor._end_paragraph()
+    except _BudgetReached:
+        pass
+    return extractor.paragraphs
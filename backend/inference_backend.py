@@ -0,0 +1,100 @@
+# inference_backend.py
+# Selects how each transformer model is run on CPU:
+#   torch       full precision PyTorch (the default)
+#   torch-int8  PyTorch with dynamic int8 quantization of the Linear layers (no extra dependencies)
+#   onnx        exported to ONNX and run with ONNX Runtime (needs `optimum[onnxruntime]`)
+#   onnx-int8   ONNX Runtime with a dynamically int8-quantized export
+#
+# The backend is chosen per model with <MODEL_NAME>_BACKEND (eg SENTENCE_ENCODER_BACKEND=onnx-int8,
+# FACT_CHECK_BACKEND=onnx), falling back to INFERENCE_BACKEND for every model. Exports are written once to
+# ONNX_MODEL_DIR and reused on later starts. Run benchmarks/parity_check.py before switching a model's backend
+# in production, since the fact check thresholds were calibrated against the full precision models.
+import os
+
+BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+# Instruction set the int8 ONNX export is tuned for: arm64, avx2, avx512 or avx512_vnni
+ONNX_QUANTIZATION = os.environ.get('ONNX_QUANTIZATION', 'avx2')
+ONNX_MODEL_DIR = os.environ.get('ONNX_MODEL_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'audit_ai', 'onnx')
+
+# Backend configured for a registered model name
+def model_backend(name):
+    backend = os.environ.get(f'{name.upper()}_BACKEND') or os.environ.get('INFERENCE_BACKEND') or 'torch'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for model '{name}' (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+# Where the export of a Hugging Face model for a given backend is kept
+def export_dir(model_id, backend):
+    return os.path.join(ONNX_MODEL_DIR, model_id.replace('/', '--'), backend)
+
+# Dynamic int8 quantization of every Linear layer (weights are quantized once, activations on the fly)
+def quantize_torch_model(model):
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def _import_optimum():
+    try:
+        import optimum.onnxruntime
+    except ImportError as e:
+        raise RuntimeError("The onnx inference backends need optimum with ONNX Runtime: pip install 'optimum[onnxruntime]'") from e
+    return optimum.onnxruntime
+
+# Loads an ONNX Runtime model for a Hugging Face checkpoint, exporting (and quantizing) it on first use.
+# model_class is the optimum ORTModelFor... class name matching the checkpoint's head, eg 'ORTModelForSequenceClassification'
+def load_onnx_model(model_id, model_class, quantize=False):
+    ort = _import_optimum()
+    ort_model_class = getattr(ort, model_class)
+    save_dir = export_dir(model_id, 'onnx-int8' if quantize else 'onnx')
+    file_name = 'model_quantized.onnx' if quantize else 'model.onnx'
+
+    if not os.path.exists(os.path.join(save_dir, file_name)):
+        model = ort_model_class.from_pretrained(model_id, export=True)
+        model.save_pretrained(save_dir)
+        if quantize:
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+            quantization_config = getattr(AutoQuantizationConfig, ONNX_QUANTIZATION)(is_static=False, per_channel=False)
+            ort.ORTQuantizer.from_pretrained(model).quantize(save_dir=save_dir, quantization_config=quantization_config)
+
+    return ort_model_class.from_pretrained(save_dir, file_name=file_name)
+
+# Loads a sequence or token classification model (plus its tokenizer) with the given backend.
+# task is 'sequence-classification' or 'token-classification'
+def load_classifier(model_id, task, backend, tokenizer_class=None):
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, AutoModelForTokenClassification
+
+    tokenizer = (tokenizer_class or AutoTokenizer).from_pretrained(model_id)
+    if backend in ('onnx', 'onnx-int8'):
+        model_class = 'ORTModelForSequenceClassification' if task == 'sequence-classification' else 'ORTModelForTokenClassification'
+        return tokenizer, load_onnx_model(model_id, model_class, quantize=backend == 'onnx-int8')
+
+    auto_class = AutoModelForSequenceClassification if task == 'sequence-classification' else AutoModelForTokenClassification
+    model = auto_class.from_pretrained(model_id)
+    # Inference only, so put the model in evaluation mode once here rather than on every forward pass
+    model.eval()
+    if backend == 'torch-int8':
+        model = quantize_torch_model(model)
+    return tokenizer, model
+
+# Loads a sentence-transformers encoder with the given backend (sentence-transformers runs the ONNX export itself,
+# keeping its pooling and normalization, so embeddings stay comparable across backends)
+def load_sentence_transformer(model_id, backend):
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'torch':
+        return SentenceTransformer(model_id)
+    if backend == 'torch-int8':
+        return quantize_torch_model(SentenceTransformer(model_id))
+
+    _import_optimum()
+    if backend == 'onnx':
+        return SentenceTransformer(model_id, backend='onnx')
+
+    save_dir = export_dir(model_id, 'onnx-int8')
+    file_name = f'onnx/model_qint8_{ONNX_QUANTIZATION}.onnx'
+    if not os.path.exists(os.path.join(save_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        model = SentenceTransformer(model_id, backend='onnx')
+        model.save_pretrained(save_dir)
+        export_dynamic_quantized_onnx_model(model, ONNX_QUANTIZATION, save_dir)
+    return SentenceTransformer(save_dir, backend='onnx', model_kwargs={'file_name': file_name})
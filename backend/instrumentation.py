@@ -0,0 +1,216 @@
+# instrumentation.py
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import os
+import sys
+import threading
+import time
+import uuid
+
+from flask import Flask, Response, g, has_request_context, jsonify, request
+
+# Header carrying the audit's request id from server.js through every Flask service (and back to the caller)
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Header asking for a single request to be run under the sampling profiler (only honoured when profiling is enabled)
+PROFILE_HEADER = 'X-Profile'
+PROFILING_ENABLED = os.environ.get('AUDIT_PROFILING_ENABLED', '') == '1'
+PROFILE_INTERVAL = float(os.environ.get('AUDIT_PROFILE_INTERVAL_MS', 5)) / 1000
+
+# Bucket upper bounds in seconds (request and stage latencies) and in items (model batch sizes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+
+# Prometheus-style cumulative histogram, keyed by label values
+class Histogram:
+    def __init__(self, name, description, label_names, buckets):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.setdefault(label_values, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def _labels(self, label_values, extra=None):
+        pairs = list(zip(self.label_names, label_values)) + ([extra] if extra else [])
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+    # Text exposition format lines for this histogram
+    def render(self):
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label_values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series['counts']):
+                    lines.append(f"{self.name}_bucket{self._labels(label_values, ('le', bound))} {count}")
+                lines.append(f"{self.name}_bucket{self._labels(label_values, ('le', '+Inf'))} {series['count']}")
+                lines.append(f"{self.name}_sum{self._labels(label_values)} {series['sum']}")
+                lines.append(f"{self.name}_count{self._labels(label_values)} {series['count']}")
+        return lines
+
+
+request_latency = Histogram('audit_request_duration_seconds', 'HTTP request latency', ('service', 'endpoint', 'status'), LATENCY_BUCKETS)
+stage_latency = Histogram('audit_stage_duration_seconds', 'Latency of each audit stage', ('service', 'stage'), LATENCY_BUCKETS)
+batch_sizes = Histogram('audit_model_batch_size', 'Inputs per model forward pass', ('model',), BATCH_SIZE_BUCKETS)
+
+# Name of the service this process is running (set by init_app, used to label stage spans)
+service_name = 'unknown'
+
+# Request id of the work running on this thread outside any request context (see request_scope)
+_thread_request = threading.local()
+
+# Current request id (inside a request, or work it handed to another thread), so log lines can be tied back to one audit
+def current_request_id():
+    if has_request_context():
+        return g.get('request_id')
+    return getattr(_thread_request, 'request_id', None)
+
+# Runs the enclosed block on behalf of a request from a thread outside its context (eg an audit stage on the executor)
+@contextmanager
+def request_scope(request_id):
+    previous = getattr(_thread_request, 'request_id', None)
+    _thread_request.request_id = request_id
+    try:
+        yield
+    finally:
+        _thread_request.request_id = previous
+
+# Prints a log line, prefixed with the current request id when there is one
+def log(message):
+    request_id = current_request_id()
+    print(f"[{request_id}] {message}" if request_id else message)
+
+# Times one stage of an audit (eg fetching a page, an encode, a forward pass) into the stage latency histogram
+@contextmanager
+def span(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        stage_latency.observe(duration, service_name, stage)
+        if has_request_context() and 'spans' in g:
+            g.spans.append((stage, duration))
+
+# Hook for the micro-batchers: records how many inputs went through each forward pass and how long it took
+def record_batch(model, size, duration):
+    batch_sizes.observe(size, model)
+    stage_latency.observe(duration, service_name, f'{model}_forward')
+
+
+# Sampling profiler for a single request: a background thread snapshots the request thread's stack every
+# interval and counts identical stacks, producing collapsed stacks (the flamegraph.pl / speedscope input format)
+class SamplingProfiler:
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='sampling-profiler', daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in self.stacks.most_common())
+
+
+# Most recent profiles by request id, retrievable from /profile/<request_id>
+profiles = OrderedDict()
+MAX_PROFILES = 32
+
+
+# Adds request-id propagation, request / stage latency histograms, a /metrics endpoint and opt-in per-request
+# profiling to a Flask app
+def init_app(app: Flask, name, batchers=()):
+    global service_name
+    service_name = name
+
+    for batcher in batchers:
+        batcher.on_batch = record_batch
+
+    @app.before_request
+    def start_request():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g.request_start = time.perf_counter()
+        g.spans = []
+        g.profiler = None
+        if PROFILING_ENABLED and request.headers.get(PROFILE_HEADER) == '1':
+            g.profiler = SamplingProfiler(threading.get_ident())
+            g.profiler.start()
+
+    @app.after_request
+    def finish_request(response):
+        if 'request_start' not in g:
+            return response
+
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_id, request_start, profiler = g.request_id, g.request_start, g.profiler
+
+        def record():
+            duration = time.perf_counter() - request_start
+            request_latency.observe(duration, name, endpoint, response.status_code)
+
+            if profiler is not None:
+                profiler.stop()
+                profiles[request_id] = {'samples': profiler.samples, 'collapsed': profiler.collapsed()}
+                while len(profiles) > MAX_PROFILES:
+                    profiles.popitem(last=False)
+
+        # A streamed body (eg /scrape_batch, /audit with stream=true) is only produced once the server iterates the
+        # response, after this hook has run, so its latency and profile are recorded when the response is closed
+        if response.is_streamed:
+            response.call_on_close(record)
+        else:
+            record()
+
+        response.headers[REQUEST_ID_HEADER] = request_id
+        # Per-stage timings for this request (Server-Timing shows up in browser dev tools). A streamed response's
+        # headers are sent before its stages run, so it only has the stages run before the body
+        if g.spans:
+            response.headers['Server-Timing'] = ', '.join(f'{stage};dur={duration * 1000:.1f}' for stage, duration in g.spans)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        lines = request_latency.render() + stage_latency.render() + batch_sizes.render()
+        if batchers:
+            lines += ['# HELP audit_model_queue_depth Inputs waiting for a forward pass', '# TYPE audit_model_queue_depth gauge']
+            lines += [f'audit_model_queue_depth{{model="{batcher.name}"}} {batcher.stats()["queue_depth"]}' for batcher in batchers]
+            lines += ['# HELP audit_model_rejected_total Inputs rejected because the queue was full', '# TYPE audit_model_rejected_total counter']
+            lines += [f'audit_model_rejected_total{{model="{batcher.name}"}} {batcher.stats()["rejected"]}' for batcher in batchers]
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    @app.route('/profile/<request_id>', methods=['GET'])
+    def profile(request_id):
+        if request_id not in profiles:
+            return jsonify({'message': 'No profile recorded for this request id'}), 404
+        return Response(profiles[request_id]['collapsed'] + '\n', mimetype='text/plain')
@@ -0,0 +1,79 @@
+# lexical.py
+import os
+
+from lru_cache import LRUCache
+from model_registry import registry
+
+# Distinct texts whose tokens (and distinct words whose stems) are kept, so a text scored again, like the same
+# answer against every sentence of every source, is tokenized and stemmed only once
+LEXICAL_CACHE_SIZE = int(os.environ.get('LEXICAL_CACHE_SIZE', 20000))
+
+
+# ROUGE's tokenizer (lower-case, alphanumeric tokens, Porter stemming of words over 3 characters) with the tokens
+# of each text and the stem of each word cached. Also passed to the RougeScorer, so ROUGE-L and the token overlap
+# scores below always see the same tokens
+class CachingTokenizer:
+    def __init__(self, tokenize_fn, stemmer, max_entries=LEXICAL_CACHE_SIZE):
+        self._tokenize_fn = tokenize_fn
+        self._stemmer = stemmer
+        self._tokens = LRUCache(max_entries)
+        self._stems = LRUCache(max_entries)
+
+    # Stands in for the stemmer inside tokenize_fn
+    def stem(self, word):
+        stem = self._stems.get(word)
+        if stem is None:
+            stem = self._stemmer.stem(word)
+            self._stems.put(word, stem)
+        return stem
+
+    def tokenize(self, text):
+        tokens = self._tokens.get(text)
+        if tokens is None:
+            tokens = self._tokenize_fn(text, self)
+            self._tokens.put(text, tokens)
+        return tokens
+
+    # Resizes both caches (0 turns them off), returning their previous size
+    def resize(self, max_entries):
+        self._stems.resize(max_entries)
+        return self._tokens.resize(max_entries)
+
+    def stats(self):
+        return {'tokens': self._tokens.stats(), 'stems': self._stems.stats()}
+
+
+# rouge_score (and the nltk stemmer behind it) is only imported by the warm-up, keeping it out of the service's
+# startup time, and registered like the models so /ready waits for it too
+def load_rouge_scorer():
+    from nltk.stem import porter
+    from rouge_score import rouge_scorer, tokenize
+
+    tokenizer = CachingTokenizer(tokenize.tokenize, porter.PorterStemmer())
+    return tokenizer, rouge_scorer.RougeScorer(['rougeL'], tokenizer=tokenizer)
+
+registry.register('rouge_scorer', load_rouge_scorer)
+
+# ROUGE-L F-measure of a hypothesis against a reference
+def rouge_l(reference, hypothesis):
+    _, scorer = registry.get('rouge_scorer')
+    return scorer.score(reference, hypothesis)['rougeL'].fmeasure
+
+# Jaccard similarity (shared distinct tokens over all distinct tokens) of one text against every sentence
+def token_overlaps(text, sentences):
+    tokenizer, _ = registry.get('rouge_scorer')
+    text_tokens = set(tokenizer.tokenize(text))
+
+    overlaps = []
+    for sentence in sentences:
+        sentence_tokens = set(tokenizer.tokenize(sentence))
+        union = len(text_tokens | sentence_tokens)
+        overlaps.append(len(text_tokens & sentence_tokens) / union if union else 0.0)
+    return overlaps
+
+# ROUGE-L F-measure and Jaccard similarity of one text (eg the answer) against every sentence, with the text
+# tokenized and stemmed once and every sentence's tokens served from the cache when seen before
+def lexical_similarities(text, sentences):
+    _, scorer = registry.get('rouge_scorer')
+    rouge_l_scores = [scorer.score(sentence, text)['rougeL'].fmeasure for sentence in sentences]
+    return rouge_l_scores, token_overlaps(text, sentences)
@@ -0,0 +1,71 @@
+# lru_cache.py
+from collections import OrderedDict
+import threading
+
+
+# Bounded, thread-safe least-recently-used cache (the oldest untouched entry is evicted once full)
+class LRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the cached value (marking it as recently used) or the default if missing
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    # Changes the capacity (0 turns the cache off), evicting the oldest entries that no longer fit, and returns the
+    # previous capacity
+    def resize(self, max_entries):
+        with self._lock:
+            previous = self.max_entries
+            self.max_entries = max_entries
+            while len(self._entries) > max(0, max_entries):
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            return previous
+
+    def values(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,76 @@
+# mmap_store.py
+import os
+import numpy as np
+
+# Rows reserved when the file is first created (capacity then doubles whenever it fills up)
+INITIAL_CAPACITY = 1024
+
+
+# Append-only float32 matrix stored in a raw file and memory-mapped, so a large set of vectors can be
+# reused across restarts (and shared between processes through the page cache) without loading it all
+# into the Python heap. The caller tracks how many rows are valid (eg in an index file next to it).
+class MappedMatrix:
+    def __init__(self, path, dim):
+        self.path = path
+        self.dim = dim
+        self._matrix = None
+
+        if os.path.exists(path) and os.path.getsize(path) >= dim * 4:
+            self._open(os.path.getsize(path) // (dim * 4))
+        else:
+            self._resize(INITIAL_CAPACITY)
+
+    @property
+    def capacity(self):
+        return self._matrix.shape[0]
+
+    @property
+    def nbytes(self):
+        return self._matrix.nbytes
+
+    def _open(self, capacity):
+        self._matrix = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    # Grows (or creates) the backing file to hold at least capacity rows and re-maps it. The file is never shrunk,
+    # since another process sharing it may already have grown it further
+    def _resize(self, capacity):
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'ab') as f:
+            size = max(capacity * self.dim * 4, os.fstat(f.fileno()).st_size)
+            f.truncate(size)
+        self._open(size // (self.dim * 4))
+
+    # Makes sure the mapping covers the first rows rows, growing the file (or re-mapping it, if another process has
+    # already grown it) as needed
+    def reserve(self, rows):
+        if rows > self.capacity:
+            capacity = self.capacity
+            while capacity < rows:
+                capacity *= 2
+            self._resize(capacity)
+
+    # Writes rows starting at row index start, growing the file as needed
+    def write(self, start, rows):
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, self.dim)
+        end = start + rows.shape[0]
+        self.reserve(end)
+        self._matrix[start:end] = rows
+
+    # Copies the requested rows out of the mapping (copies stay valid after the file is re-mapped on growth)
+    def read(self, rows):
+        return np.array(self._matrix[rows])
+
+    def flush(self):
+        self._matrix.flush()
+
+    # Flushes and releases the mapping (the object must not be used afterwards)
+    def close(self):
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
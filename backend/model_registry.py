@@ -0,0 +1,113 @@
+# model_registry.py
+import threading
+import time
+
+from flask import jsonify
+
+
+# Holds every model a service needs so they are loaded (deserialized from disk) exactly once per
+# process and then shared by all requests, instead of being re-loaded inside each request handler
+class ModelRegistry:
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._errors = {}
+        self._load_times = {}
+        # Guards the bookkeeping dictionaries above
+        self._lock = threading.Lock()
+        # One lock per model so that two requests arriving before warm-up do not both load the same model
+        self._load_locks = {}
+        # One lock per model to serialize inference (HF fast tokenizers are not safe to share between threads)
+        self._inference_locks = {}
+
+    # Registers a zero-argument loader function for a model name (nothing is loaded until needed)
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._load_locks.setdefault(name, threading.Lock())
+            self._inference_locks.setdefault(name, threading.RLock())
+            # Re-registering a name drops any previously loaded instance
+            self._models.pop(name, None)
+            self._errors.pop(name, None)
+
+    # Returns the loaded model, loading it on first use (double-checked so loads happen only once)
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        if name not in self._loaders:
+            raise KeyError(f"Model '{name}' has not been registered")
+
+        with self._load_locks[name]:
+            model = self._models.get(name)
+            if model is None:
+                start = time.perf_counter()
+                try:
+                    model = self._loaders[name]()
+                except Exception as e:
+                    with self._lock:
+                        self._errors[name] = str(e)
+                    raise
+                with self._lock:
+                    self._models[name] = model
+                    self._errors.pop(name, None)
+                    self._load_times[name] = time.perf_counter() - start
+        return model
+
+    # Lock to hold while running inference on a shared model
+    def inference_lock(self, name):
+        return self._inference_locks[name]
+
+    # Loads the given models (or every registered model) up front, so the first request does not pay for it
+    def warm_up(self, names=None):
+        for name in names or list(self._loaders):
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Error loading model '{name}': {e}")
+
+    # Loads the models on a background thread, so a service can start accepting requests (and answer /ready
+    # with 503) straight away instead of only after every model has been read from disk
+    def start_warm_up(self, names=None):
+        thread = threading.Thread(target=self.warm_up, args=(names,), name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    # True once every requested (or registered) model is loaded and ready to serve
+    def is_ready(self, names=None):
+        return all(name in self._models for name in names or list(self._loaders))
+
+    # Per-model load state, used for the health endpoint
+    def status(self, names=None):
+        status = {}
+        for name in names or list(self._loaders):
+            if name in self._models:
+                status[name] = {'state': 'loaded', 'load_seconds': round(self._load_times[name], 3)}
+            elif name in self._errors:
+                status[name] = {'state': 'error', 'error': self._errors[name]}
+            elif self._load_locks[name].locked():
+                status[name] = {'state': 'loading'}
+            else:
+                status[name] = {'state': 'not_loaded'}
+        return status
+
+
+# Process wide registry shared by every service (and every request within a service)
+registry = ModelRegistry()
+
+
+# Adds /health (liveness plus model status) and /ready (200 only once models are loaded) routes to a Flask app
+def register_health_routes(app, model_names):
+    @app.route('/health', methods=['GET'])
+    def health():
+        return jsonify({
+            'status': 'ok',
+            'ready': registry.is_ready(model_names),
+            'models': registry.status(model_names)
+        })
+
+    @app.route('/ready', methods=['GET'])
+    def ready():
+        is_ready = registry.is_ready(model_names)
+        return jsonify({'ready': is_ready}), 200 if is_ready else 503
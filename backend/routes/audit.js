@@ -0,0 +1,32 @@
+const express = require('express');
+const axios = require('axios');
+const router = express.Router();
+
+// Runs a full audit of a QA pair (similarity, sentiment, scraping and fact checking each of the provided source urls)
+// in a single call to the audit pipeline service, instead of one call per stage and per source
+router.post('/', async (req, res) => {
+  const { question, answer, urls, sentence_bound, stream } = req.body;
+
+  try {
+    const response = await axios.post('http://127.0.0.1:5006/audit', {
+      question,
+      answer,
+      urls,
+      sentence_bound,
+      stream
+    }, { responseType: stream ? 'stream' : 'json', headers: req.traceHeaders });
+
+    // Streamed audits forward each stage's result (one JSON object per line) as soon as it is ready
+    if (stream) {
+      res.setHeader('Content-Type', 'application/x-ndjson');
+      return response.data.pipe(res);
+    }
+
+    res.json(response.data);
+  } catch (error) {
+    console.error('Error calling audit service:', error);
+    return res.status(500).json({ message: 'Error calling audit service' });
+  }
+});
+
+module.exports = router;
@@ -11,7 +11,7 @@ router.post('/', async (req, res) => {
     const response = await axios.post('http://127.0.0.1:5005/fact_check', {
       summary,
       answer
-    });
+    }, { headers: req.traceHeaders });
     
     res.json({
       message: 'Answer Successfully Fact Checked Using Source',
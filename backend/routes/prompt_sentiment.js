@@ -10,7 +10,7 @@ router.post('/', async (req, res) => {
     const response = await axios.post('http://127.0.0.1:5003/sentiment', {
       question,
       answer,
-    });
+    }, { headers: req.traceHeaders });
     
     res.json({
       message: 'Sentiment Analysis Retrieved from Microservice',
@@ -10,7 +10,7 @@ router.post('/', async (req, res) => {
     const response = await axios.post('http://127.0.0.1:5002/similarity', {
       question,
       answer,
-    });
+    }, { headers: req.traceHeaders });
     
     res.json({
       message: 'Cosine Similarity Retrieved from Microservice',
@@ -36,7 +36,7 @@ router.post('/sources', async (req, res) => {
     const response = await axios.post('http://127.0.0.1:5002/source_similarity', {
       user_qa_element,
       source
-    });
+    }, { headers: req.traceHeaders });
 
     res.json({
       similarityScore: response.data.similarityScore,
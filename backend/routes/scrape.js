@@ -14,7 +14,7 @@ router.post('/', async (req, res) => {
       sentence_bound,
       question,
       answer
-    });
+    }, { headers: req.traceHeaders });
     
     res.json({
       message: 'Content Successfully Scraped From Source',
@@ -27,4 +27,25 @@ router.post('/', async (req, res) => {
   }
 });
 
+// Scrapes several URLs for the same QA pair concurrently, streaming each source's result back
+// (one JSON object per line) as soon as it has been fetched and scored by the scraping service
+router.post('/batch', async (req, res) => {
+  const { urls, sentence_bound, question, answer } = req.body;
+
+  try {
+    const response = await axios.post('http://127.0.0.1:5004/scrape_batch', {
+      urls,
+      sentence_bound,
+      question,
+      answer
+    }, { responseType: 'stream', headers: req.traceHeaders });
+
+    res.setHeader('Content-Type', 'application/x-ndjson');
+    response.data.pipe(res);
+  } catch (error) {
+    console.error('Error calling batch scraping service:', error);
+    return res.status(500).json({ message: 'Error calling batch scraping service' });
+  }
+});
+
 module.exports = router;
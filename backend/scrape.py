@@ -1,117 +1,179 @@
-from flask import Flask, request, jsonify
-import requests
-import heapq
-from bs4 import BeautifulSoup
+from flask import Flask, request, jsonify, Response, stream_with_context
+from html_extract import extract_paragraphs
+from embeddings import get_embeddings, normalize_embeddings, top_k_indices, encoder_batcher, source_index
+from fetcher import PageFetcher, PageCache, FetchError
+from lexical import token_overlaps
+import numpy as np
+import json
+import os
+from model_registry import registry, register_health_routes
+from batching import register_batching_routes
+import instrumentation
+from instrumentation import span, log
 
 app = Flask(__name__)
 
+# When set, only this many paragraphs of a newly fetched page (those sharing the most words with the question or
+# the answer) are embedded and scored. Pre-filtered pages are specific to one QA pair, so they are not indexed
+SCRAPE_PREFILTER_TOP_K = int(os.environ.get('SCRAPE_PREFILTER_TOP_K', 0))
+
+SCRAPE_MODELS = ['sentence_encoder'] + (['rouge_scorer'] if SCRAPE_PREFILTER_TOP_K else [])
+register_health_routes(app, SCRAPE_MODELS)
+register_batching_routes(app, [encoder_batcher])
+instrumentation.init_app(app, 'scrape', [encoder_batcher])
+
+# Pooled, concurrent page fetcher shared by every request, with a TTL cache of fetched pages (revalidated
+# through ETag / Last-Modified once expired) so repeat audits of the same source skip the download
+page_fetcher = PageFetcher(
+    timeout=3,
+    total_timeout=float(os.environ.get('SCRAPE_TOTAL_TIMEOUT', 10)),
+    max_connections=int(os.environ.get('SCRAPE_MAX_CONNECTIONS', 32)),
+    per_host_limit=int(os.environ.get('SCRAPE_PER_HOST_LIMIT', 4)),
+    cache=PageCache(
+        max_entries=int(os.environ.get('SCRAPE_CACHE_SIZE', 256)),
+        ttl=int(os.environ.get('SCRAPE_CACHE_TTL', 300))
+    )
+)
+
+def check_scrape_allowed(url):
+    # Check if "reddit" is in the URL to avoid scraping
+    if "reddit" in url or "r/" in url:
+        raise ValueError("Scraping Reddit URLs is not allowed to avoid potential bans.")
+
+# Stream the p-tag text out of the page, skipping navigation / footer / script boilerplate, and stop
+# parsing once we reach the sentence_bound * 15 limit (the rest of the document is never parsed)
+# 15 was determined to be robust through user testing using a broad selection of topics / source articles
+def paragraph_budget(sentence_bound):
+    return max(1, sentence_bound * 15)
+
 def scrape_text(url, sentence_bound, question, answer):
     try:
-
-        # Check if "reddit" is in the URL to avoid scraping
-        if "reddit" in url or "r/" in url:
-            raise ValueError("Scraping Reddit URLs is not allowed to avoid potential bans.")
-
-        # Simulates being a web user (at a very low level) but could bypass simple attempts to prevent web scrapers
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
-        }
-        
-        # Fetch the content from the URL
-        response = requests.get(url, headers=headers, timeout=3, allow_redirects=True)
-        response.raise_for_status()  # Raise an error for bad status codes
-        
-        # Parse the HTML content with BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Find all p-tags
-        p_tags = soup.find_all('p')
-        
-        # Initialize a min-heap for the top 3 sentences based on similarity score
-        top_3_sentences = []
-        # Initialize the most correlated sentence to the answer (to show the user is anything similar to their answer in the source)
-        most_correlated_answer_sentence = ""
-        most_correlated_answer_similarity = 0
-
-        # Loop through each p-tag and calculate similarity with the question
-        for i, p_tag in enumerate(p_tags):
-            p_text = p_tag.get_text()
-            
-            # Prepare data for determining sentence similarity to question via microservice
-            similarity_question_payload = {
-                'user_qa_element': question,
-                'source': p_text
-            }
-            
-            try:
-                # Send POST request to the similarity microservice
-                similarity_response = requests.post(
-                    'http://localhost:5002/source_similarity',  # URL for the microservice
-                    json=similarity_question_payload
-                )
-                
-                # Parse the JSON response
-                similarity_data = similarity_response.json()
-                similarity_score = similarity_data.get('similarityScore')
-
-                # Maintain a max heap of the top 3 similarity scores and sentences
-                if len(top_3_sentences) < 3:
-                    heapq.heappush(top_3_sentences, (similarity_score, p_text))
-                else:
-                    # Only push if the new similarity score is higher than the lowest in the heap
-                    if similarity_score > top_3_sentences[0][0]:
-                        heapq.heappushpop(top_3_sentences, (similarity_score, p_text))
-            
-            except requests.exceptions.RequestException as e:
-                print(f"Error calculating similarity for p tag #{i + 1}: {e}")
-
-            # Prepare data for determining sentence similarity to question via microservice
-            similarity_answer_payload = {
-                'user_qa_element': answer,
-                'source': p_text
-            }
-            
-            try:
-                # Send POST request to the similarity microservice
-                similarity_response = requests.post(
-                    'http://localhost:5002/source_similarity',  # URL for the microservice
-                    json=similarity_answer_payload
-                )
-                
-                # Parse the JSON response
-                similarity_data = similarity_response.json()
-                similarity_score = similarity_data.get('similarityScore')
-
-                # Maintain the most correlated sentence in the source to the answer
-                if similarity_score > most_correlated_answer_similarity:
-                    most_correlated_answer_similarity = similarity_score
-                    most_correlated_answer_sentence = similarity_data.get('source')
-            
-            except requests.exceptions.RequestException as e:
-                print(f"Error calculating similarity for p tag #{i + 1}: {e}")
-
-            # Stop once we reach the sentence_bound * 15 limit (soup is quite fast at parsing)
-            # 15 was determined to be robust through user testing using a broad selection of topics / source articles
-            if i + 1 >= sentence_bound * 15:
-                break
-
-        # Sort the top 3 sentences by score in descending order
-        top_3_sentences = sorted(top_3_sentences, key=lambda x: x[0], reverse=True)
-
-        # Poll the top response and leave the remaining top 4 (this is done to remove the 
-        # most similar sentence because it is usually a paraphrase of the original user question, ie not relevant or helpful)
-        top_response = top_3_sentences.pop(0) if top_3_sentences else None
-        top_2_correlated_question_sentences = [(score, sentence) for score, sentence in top_3_sentences]
-
-        # Return the most correlated answer sentence and top 2 most correlated question sentences with scores
-        return most_correlated_answer_sentence, top_2_correlated_question_sentences
-
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while fetching the URL: {e}")
+        check_scrape_allowed(url)
+
+        # A source indexed recently enough is scored straight from the index, without fetching the page
+        passages = source_index.get(url, paragraph_budget(sentence_bound))
+        if passages is None:
+            # Fetch the content from the URL
+            with span('fetch'):
+                html = page_fetcher.fetch(url)
+            passages = page_passages(url, html, sentence_bound, question, answer)
+        return score_passages(*passages, question, answer)
+
+    except FetchError as e:
+        log(f"An error occurred while fetching the URL: {e}")
         return None, None
     except ValueError as e:
-        print(f"Error: {e}")
+        log(f"Error: {e}")
+        return None, None
+
+# Extracts the paragraphs of a fetched page, embeds them and records both in the source index, returning
+# (paragraphs, unit-length embeddings). A re-fetched page whose paragraphs are unchanged is not re-encoded
+def index_page(url, html, sentence_bound):
+    max_paragraphs = paragraph_budget(sentence_bound)
+    with span('parse'):
+        p_texts = extract_paragraphs(html, max_paragraphs)
+    # Extraction stopped at the budget, so a later request with a larger budget needs the page again
+    truncated = len(p_texts) >= max_paragraphs
+
+    if source_index.indexed_hash(url) == source_index.content_hash(p_texts):
+        source_index.touch(url, truncated)
+        passages = source_index.get(url, max_paragraphs)
+        if passages is not None:
+            return passages
+
+    p_vectors = normalize_embeddings(get_embeddings(p_texts)) if p_texts else np.empty((0, 0), dtype=np.float32)
+    source_index.put(url, p_texts, p_vectors, truncated)
+    return p_texts, p_vectors
+
+# Extracts the paragraphs of a fetched page, keeping only the SCRAPE_PREFILTER_TOP_K with the highest token overlap
+# (Jaccard) with the question or the answer before any of them are embedded, returning (paragraphs, embeddings)
+def prefilter_page(html, sentence_bound, question, answer):
+    with span('parse'):
+        p_texts = extract_paragraphs(html, paragraph_budget(sentence_bound))
+
+    if len(p_texts) > SCRAPE_PREFILTER_TOP_K:
+        with span('prefilter'):
+            overlaps = np.maximum(token_overlaps(question, p_texts), token_overlaps(answer, p_texts))
+            # Kept in page order, so ties between equally similar paragraphs resolve as they would unfiltered
+            p_texts = [p_texts[i] for i in sorted(top_k_indices(overlaps, SCRAPE_PREFILTER_TOP_K))]
+
+    p_vectors = normalize_embeddings(get_embeddings(p_texts)) if p_texts else np.empty((0, 0), dtype=np.float32)
+    return p_texts, p_vectors
+
+# Paragraphs and embeddings of a fetched page, pre-filtered for this QA pair when SCRAPE_PREFILTER_TOP_K is set
+# and otherwise indexed in full
+def page_passages(url, html, sentence_bound, question, answer):
+    if SCRAPE_PREFILTER_TOP_K:
+        return prefilter_page(html, sentence_bound, question, answer)
+    return index_page(url, html, sentence_bound)
+
+# Finds the paragraphs of a fetched page most correlated to the question and to the answer
+def score_page(url, html, sentence_bound, question, answer):
+    return score_passages(*page_passages(url, html, sentence_bound, question, answer), question, answer)
+
+# Yields (url, page) for each source as soon as it is available, where page is the source's indexed (paragraphs,
+# embeddings) when it is fresh in the index, the fetched html otherwise, or a FetchError when the url may not be
+# scraped or could not be fetched. Indexed sources come first, without being fetched, then the rest of the pages
+# are fetched concurrently (used by /scrape_batch and the audit pipeline)
+def source_pages(urls, sentence_bound):
+    urls_to_fetch = []
+    for url in urls:
+        try:
+            check_scrape_allowed(url)
+        except ValueError as e:
+            log(f"Error: {e}")
+            yield url, FetchError(str(e))
+            continue
+
+        passages = source_index.get(url, paragraph_budget(sentence_bound))
+        if passages is None:
+            urls_to_fetch.append(url)
+        else:
+            yield url, passages
+
+    for url, html in page_fetcher.fetch_many(urls_to_fetch):
+        if isinstance(html, FetchError):
+            log(f"An error occurred while fetching the URL: {html}")
+        yield url, html
+
+# Finds the paragraphs of a source yielded by source_pages most correlated to the question and to the answer,
+# or (None, None) if it could not be scraped
+def score_source(url, page, sentence_bound, question, answer):
+    if isinstance(page, FetchError):
         return None, None
+    if isinstance(page, tuple):
+        return score_passages(*page, question, answer)
+    return score_page(url, page, sentence_bound, question, answer)
+
+# Finds the paragraphs (with their unit-length embeddings) most correlated to the question and to the answer
+def score_passages(p_texts, p_vectors, question, answer):
+    # Embed the question and answer once for the whole page
+    qa_vectors = normalize_embeddings(get_embeddings([question, answer]))
+    if not p_texts:
+        p_vectors = np.empty((0, qa_vectors.shape[-1]), dtype=np.float32)
+
+    # Score every p-tag against both the question and the answer in a single matrix product
+    # (embeddings are unit length, so the dot product is the cosine similarity)
+    similarity_scores = p_vectors @ qa_vectors.T
+    question_similarity_scores, answer_similarity_scores = similarity_scores[:, 0], similarity_scores[:, 1]
+
+    # Take the top 3 sentences based on similarity score to the question, sorted by score in descending order
+    top_3_sentences = [(float(question_similarity_scores[i]), p_texts[i]) for i in top_k_indices(question_similarity_scores, 3)]
+
+    # Find the most correlated sentence to the answer (to show the user is anything similar to their answer in the source)
+    most_correlated_answer_sentence = ""
+    if len(p_texts) > 0:
+        best_answer_index = int(np.argmax(answer_similarity_scores))
+        if answer_similarity_scores[best_answer_index] > 0:
+            most_correlated_answer_sentence = p_texts[best_answer_index]
+
+    # Poll the top response and leave the remaining top 4 (this is done to remove the 
+    # most similar sentence because it is usually a paraphrase of the original user question, ie not relevant or helpful)
+    top_response = top_3_sentences.pop(0) if top_3_sentences else None
+    top_2_correlated_question_sentences = [(score, sentence) for score, sentence in top_3_sentences]
+
+    # Return the most correlated answer sentence and top 2 most correlated question sentences with scores
+    return most_correlated_answer_sentence, top_2_correlated_question_sentences
 
 @app.route('/scrape', methods=['POST'])
 def scrape_website():
@@ -136,5 +198,39 @@ def scrape_website():
         'most_correlated_answer_sentence': most_correlated_answer_sentence
     })
 
+# Scrapes several sources for the same QA pair at once: pages are fetched concurrently and each source's
+# result is streamed back (as one JSON object per line) as soon as that source has been fetched and scored
+@app.route('/scrape_batch', methods=['POST'])
+def scrape_websites():
+    data = request.get_json()
+
+    urls = data.get("urls", [])
+    sentence_bound = data.get("sentence_bound", "")
+    question = data.get("question", "")
+    answer = data.get("answer", "")
+
+    if not isinstance(urls, list) or not all(isinstance(item, str) for item in urls):
+        raise ValueError("urls must be of type: list of strings (string[])")
+
+    def generate():
+        for url, page in source_pages(urls, sentence_bound):
+            yield scrape_result_line(url, *score_source(url, page, sentence_bound, question, answer))
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+# Size, hit-rate and compaction metrics for the source index
+@app.route('/source_index', methods=['GET'])
+def source_index_stats():
+    return jsonify(source_index.stats())
+
+def scrape_result_line(url, most_correlated_answer_sentence, top_2_correlated_question_sentences):
+    return json.dumps({
+        'url': url,
+        'most_correlated_answer_sentence': most_correlated_answer_sentence,
+        'top_2_correlated_question_sentences': top_2_correlated_question_sentences
+    }) + "\n"
+
 if __name__ == '__main__':
+    # Load the sentence transformer in the background while the server starts (/ready reports when it is warm)
+    registry.start_warm_up(SCRAPE_MODELS)
     app.run(port=5004)
\ No newline at end of file
@@ -0,0 +1,62 @@
+# sentences.py
+import re
+
+# Abbreviations whose trailing period does not end a sentence (compared lower-cased, without the final period)
+ABBREVIATIONS = {
+    'e.g', 'i.e', 'etc', 'vs', 'cf', 'al', 'approx', 'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr',
+    'mt', 'fig', 'inc', 'ltd', 'corp', 'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug',
+    'sep', 'sept', 'oct', 'nov', 'dec', 'u.s', 'u.k', 'a.m', 'p.m'
+}
+# Abbreviations that are also words which can end a sentence ("he said no.", "the co."), so they only count when
+# capitalized ("St. Louis", "Acme Co."), and "No." only when a number follows ("No. 5")
+CAPITALIZED_ABBREVIATIONS = {'St', 'Co', 'No'}
+
+# Fragments shorter than this (in words) carry no claim worth checking
+MIN_SENTENCE_WORDS = 3
+
+# Candidate sentence ends: terminal punctuation (plus closing quotes / brackets) followed by whitespace
+SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+WHITESPACE = re.compile(r'\s+')
+
+# Whether a period after word (followed by next_char) belongs to an abbreviation or a single-letter initial
+def is_abbreviation(word, next_char):
+    if word in CAPITALIZED_ABBREVIATIONS:
+        return word != 'No' or next_char.isdigit()
+    return word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+# Splits a paragraph into sentences, without breaking on abbreviations ("e.g.", "Dr."), initials ("J. R. R.")
+# or decimals ("3.5", which never match since the period is not followed by whitespace)
+def segment_sentences(text):
+    sentences = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        candidate = text[start:match.end()].strip()
+        last_word = candidate.rstrip('"\')].!?').split(' ')[-1] if candidate else ''
+
+        # Keep going if the period belongs to an abbreviation or a single-letter initial
+        if text[match.start()] == '.' and is_abbreviation(last_word, text[match.end():match.end() + 1]):
+            continue
+
+        sentences.append(candidate)
+        start = match.end()
+
+    sentences.append(text[start:].strip())
+    return [sentence for sentence in sentences if sentence]
+
+# Collapses whitespace and case so trivially different copies of a sentence are treated as duplicates
+def normalize_sentence(sentence):
+    return WHITESPACE.sub(' ', sentence).strip().lower()
+
+# Segments every evidence paragraph and returns the distinct, non-trivial sentences (first occurrence, in order)
+def prepare_evidence_sentences(paragraphs, min_words=MIN_SENTENCE_WORDS):
+    seen = set()
+    sentences = []
+    for paragraph in paragraphs:
+        for sentence in segment_sentences(paragraph):
+            sentence = WHITESPACE.sub(' ', sentence)
+            key = normalize_sentence(sentence)
+            if len(key.split(' ')) < min_words or key in seen:
+                continue
+            seen.add(key)
+            sentences.append(sentence)
+    return sentences
@@ -1,10 +1,30 @@
 from flask import Flask, request, jsonify
-from transformers import pipeline
+from model_registry import registry, register_health_routes
+from inference_backend import model_backend, load_classifier
+from lru_cache import LRUCache
+from batching import MicroBatcher, register_batching_routes
+import instrumentation
+from instrumentation import span
+import os
 
 app = Flask(__name__)
 
 # Initialize the classifier pipeline with the Go Emotions model
-classifier = pipeline(task="text-classification", model="SamLowe/roberta-base-go_emotions", top_k=5)
+# (run with the backend set by EMOTION_CLASSIFIER_BACKEND / INFERENCE_BACKEND, see inference_backend.py)
+def load_emotion_classifier():
+    from transformers import pipeline
+    tokenizer, model = load_classifier("SamLowe/roberta-base-go_emotions", 'sequence-classification', model_backend('emotion_classifier'))
+    return pipeline(task="text-classification", model=model, tokenizer=tokenizer, top_k=5)
+
+SENTIMENT_MODELS = ['emotion_classifier']
+registry.register('emotion_classifier', load_emotion_classifier)
+register_health_routes(app, SENTIMENT_MODELS)
+
+# Number of texts per forward pass through the classifier (tune to the host's CPU / memory)
+SENTIMENT_BATCH_SIZE = int(os.environ.get('SENTIMENT_BATCH_SIZE', 16))
+
+# Recently scored texts -> (sentiment, emotion), so repeated questions / answers skip the model entirely
+sentiment_cache = LRUCache(int(os.environ.get('SENTIMENT_CACHE_SIZE', 10000)))
 
 # Define the mapping of emotions to sentiment categories
 emotion_sentiment_mapping = {
@@ -38,11 +58,8 @@ emotion_sentiment_mapping = {
     'disgust': 'negative',
 }
 
-def get_sentiment(text):
-    # Use the classifier to get emotions, selecting the top emotion
-    emotions = classifier(text)
-    top_emotion = emotions[0][0]["label"]
-    
+# Maps the classifier's top emotion to a (sentiment, emotion) pair
+def emotion_to_sentiment(top_emotion):
     # Check if the top emotion is in the mapping
     if top_emotion not in emotion_sentiment_mapping:
         raise ValueError(f"Emotion '{top_emotion}' not found in sentiment mapping.")
@@ -55,6 +72,51 @@ def get_sentiment(text):
     
     return sentiment, top_emotion
 
+# Runs one coalesced batch of (text, truncation, batch_size) inputs, possibly from several concurrent requests,
+# through the classifier (inputs asking for different truncation / batch_size settings are run separately)
+def classify_batch(items):
+    classifier = registry.get('emotion_classifier')
+    groups = {}
+    for index, (text, truncation, batch_size) in enumerate(items):
+        groups.setdefault((truncation, batch_size), []).append(index)
+
+    results = [None] * len(items)
+    for (truncation, batch_size), indices in groups.items():
+        with registry.inference_lock('emotion_classifier'):
+            # Use the classifier to get emotions
+            emotions = classifier([items[i][0] for i in indices], batch_size=batch_size, truncation=truncation)
+        for i, text_emotions in zip(indices, emotions):
+            results[i] = text_emotions
+    return results
+
+# Coalesces concurrent requests' texts into shared forward passes
+sentiment_batcher = MicroBatcher('emotion_classifier', classify_batch, max_batch_size=int(os.environ.get('SENTIMENT_MAX_BATCH_SIZE', 64)))
+register_batching_routes(app, [sentiment_batcher])
+instrumentation.init_app(app, 'sentiment', [sentiment_batcher])
+
+def get_sentiment(text):
+    return get_sentiments([text])[0]
+
+# Calculates (sentiment, emotion) for every text, running only uncached texts through the classifier in batches
+def get_sentiments(texts, batch_size=SENTIMENT_BATCH_SIZE, truncation=True):
+    results = [sentiment_cache.get((text, truncation)) for text in texts]
+
+    # Score each distinct missing text once, all of them through the same batched forward passes
+    missing_texts = list(dict.fromkeys(text for text, result in zip(texts, results) if result is None))
+    if missing_texts:
+        with span('emotion_classifier'):
+            emotions = sentiment_batcher.run_many([(text, truncation, batch_size) for text in missing_texts])
+
+        scored = {}
+        for text, text_emotions in zip(missing_texts, emotions):
+            # Select the top emotion
+            scored[text] = emotion_to_sentiment(text_emotions[0]["label"])
+            sentiment_cache.put((text, truncation), scored[text])
+
+        results = [scored[text] if result is None else result for text, result in zip(texts, results)]
+
+    return results
+
 @app.route('/sentiment', methods=['POST'])
 def analyze_sentiment():
     data = request.get_json()
@@ -63,9 +125,8 @@ def analyze_sentiment():
     question = data.get("question", "")
     answer = data.get("answer", "")
     
-    # Calculate sentiment for question and answer
-    question_sentiment, question_emotion = get_sentiment(question)
-    answer_sentiment, answer_emotion = get_sentiment(answer)
+    # Calculate sentiment for question and answer (together, in one forward pass)
+    (question_sentiment, question_emotion), (answer_sentiment, answer_emotion) = get_sentiments([question, answer])
     
     # Return the sentiments as a JSON response
     return jsonify({
@@ -78,5 +139,34 @@ def analyze_sentiment():
         'answer': answer
     })
 
+# Calculates the sentiment of many texts at once (eg several QA pairs), batching them through the classifier
+@app.route('/sentiment_batch', methods=['POST'])
+def analyze_sentiment_batch():
+    data = request.get_json()
+
+    texts = data.get("texts", [])
+    batch_size = data.get("batch_size", SENTIMENT_BATCH_SIZE)
+    truncation = data.get("truncation", True)
+
+    # Ensure the texts and the classifier settings are in proper form
+    if not isinstance(texts, list) or not all(isinstance(item, str) for item in texts):
+        raise ValueError("texts must be of type: list of strings (string[])")
+    elif not isinstance(batch_size, int) or isinstance(batch_size, bool) or batch_size < 1:
+        raise ValueError("batch_size must be a positive integer")
+    elif not isinstance(truncation, bool):
+        raise ValueError("truncation must be of type: bool")
+
+    sentiments = get_sentiments(texts, batch_size=batch_size, truncation=truncation)
+
+    return jsonify({
+        'message': 'Sentiment Analysis Calculated',
+        'results': [
+            {'text': text, 'sentiment': sentiment, 'emotion': emotion}
+            for text, (sentiment, emotion) in zip(texts, sentiments)
+        ]
+    })
+
 if __name__ == '__main__':
+    # Load the classifier in the background while the server starts (/ready reports when it is warm)
+    registry.start_warm_up(SENTIMENT_MODELS)
     app.run(port=5003)
\ No newline at end of file
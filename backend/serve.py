@@ -0,0 +1,134 @@
+# serve.py
+# Production serving for the Python services with gunicorn, instead of Flask's development server (app.run).
+#
+# The service module is imported and its models are loaded once in the gunicorn master (preload), then the
+# workers are forked from it, so the model weights are shared copy-on-write between workers rather than loaded
+# once per worker. Each worker is a threaded (gthread) worker: request threads wait on the shared micro-batchers
+# (one inference thread per model) and on the scrape fetcher's event loop, so one slow request no longer holds
+# up every other client. Workers finish in-flight requests on SIGTERM (up to the graceful timeout) and then close
+# the batchers and the page fetcher and flush the caches.
+#
+# Usage (from backend/):
+#   python serve.py scrape                                   # port 5004, 1 worker x 32 threads
+#   python serve.py fact_check --workers 2 --threads 8 --timeout 120
+#   SERVE_WORKERS=4 python serve.py similarity
+import argparse
+import gc
+import importlib
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+# Port and default threads per worker for each service. The I/O bound scrape service gets many threads, as its
+# requests mostly wait on the network rather than the CPU
+SERVICES = {
+    'similarity': {'port': 5002, 'threads': 8},
+    'sentiment': {'port': 5003, 'threads': 8},
+    'scrape': {'port': 5004, 'threads': 32},
+    'fact_check': {'port': 5005, 'threads': 8},
+    'audit': {'port': 5006, 'threads': 16}
+}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve one of the audit microservices with gunicorn")
+    parser.add_argument('service', choices=list(SERVICES))
+    parser.add_argument('--bind', help="address to listen on (default 127.0.0.1:<service port>)")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('SERVE_WORKERS', 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('SERVE_THREADS', 0)) or None,
+                        help="request threads per worker (default depends on the service)")
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('SERVE_TIMEOUT', 60)),
+                        help="seconds a worker may go silent before it is killed and replaced")
+    parser.add_argument('--graceful-timeout', type=int, default=int(os.environ.get('SERVE_GRACEFUL_TIMEOUT', 30)),
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument('--max-requests', type=int, default=int(os.environ.get('SERVE_MAX_REQUESTS', 0)),
+                        help="recycle a worker after this many requests (0 never)")
+    parser.add_argument('--worker-class', default=os.environ.get('SERVE_WORKER_CLASS', 'gthread'))
+    return parser.parse_args()
+
+
+# Threads each worker's torch should use for one forward pass, so workers do not oversubscribe the cores
+def torch_threads_per_worker(workers):
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def post_fork(server, worker):
+    # Threads do not survive a fork (the batchers and fetcher restart theirs lazily in the worker), but torch's
+    # thread pool size is per process and has to be set again
+    if 'torch' in sys.modules:
+        sys.modules['torch'].set_num_threads(torch_threads_per_worker(server.cfg.workers))
+
+    # The master released the source index's persistent directory before forking (see load). A single worker takes
+    # it over, re-reading it so it continues from what a recycled worker before it wrote rather than from the master's
+    # copy, while with several workers each one moves its index into a directory of its own. (The embedding cache's
+    # disk tier needs neither: every process appends to it under a file lock)
+    if 'embeddings' in sys.modules:
+        source_index = sys.modules['embeddings'].source_index
+        if server.cfg.workers > 1:
+            source_index.detach()
+        else:
+            source_index.reload()
+
+def worker_exit(server, worker):
+    from batching import close_batchers
+    close_batchers()
+
+    if 'scrape' in sys.modules:
+        sys.modules['scrape'].page_fetcher.close()
+    if 'embeddings' in sys.modules:
+        embeddings = sys.modules['embeddings']
+        embeddings.embedding_cache.flush()
+        embeddings.source_index.flush()
+
+
+class ServiceApplication(BaseApplication):
+    def __init__(self, service, options):
+        self.service = service
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    # Runs once in the master (preload_app), before any worker is forked. The models are loaded here synchronously
+    # rather than on the background warm-up thread the development servers use, since the workers must be forked
+    # with the models already in memory (and a fork should not race a thread that is still loading them)
+    def load(self):
+        from model_registry import registry
+
+        module = importlib.import_module(self.service)
+        registry.warm_up(getattr(module, f'{self.service.upper()}_MODELS'))
+
+        # Move everything loaded so far out of the garbage collector's reach, so collections in the workers do not
+        # touch (and so copy) the pages holding the shared models
+        gc.collect()
+        gc.freeze()
+
+        # The workers own the source index's directory from here on, so the master must never flush it
+        if 'embeddings' in sys.modules:
+            sys.modules['embeddings'].source_index.release()
+        return module.app
+
+def main():
+    args = parse_args()
+    service = SERVICES[args.service]
+
+    options = {
+        'bind': args.bind or f"127.0.0.1:{service['port']}",
+        'workers': args.workers,
+        'worker_class': args.worker_class,
+        'threads': args.threads or service['threads'],
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        'preload_app': True,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+        'proc_name': f'audit-{args.service}'
+    }
+    ServiceApplication(args.service, options).run()
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,7 @@ const express = require('express');
 const cors = require('cors');
 const bodyParser = require('body-parser');
 const dotenv = require('dotenv');
+const crypto = require('crypto');
 
 dotenv.config();
 
@@ -10,7 +11,8 @@ const app = express();
 const corsOptions = {
     origin: '*',
     methods: 'GET,POST,OPTIONS',
-    allowedHeaders: ['Content-Type'],
+    allowedHeaders: ['Content-Type', 'X-Request-ID', 'X-Profile'],
+    exposedHeaders: ['X-Request-ID'],
 };
 
 app.use(cors(corsOptions));
@@ -20,12 +22,25 @@ app.options('*', cors(corsOptions));
 
 app.use(bodyParser.json());
 
+// Tag every request with an id (the caller's, if it sent one) that is forwarded to each Python service it calls,
+// so one audit can be followed through the service logs, /metrics and /profile/<request id>
+app.use((req, res, next) => {
+  req.requestId = req.get('X-Request-ID') || crypto.randomUUID();
+  req.traceHeaders = { 'X-Request-ID': req.requestId };
+  if (req.get('X-Profile')) {
+    req.traceHeaders['X-Profile'] = req.get('X-Profile');
+  }
+  res.setHeader('X-Request-ID', req.requestId);
+  next();
+});
+
 // Import Routes
 const similarityRoutes = require('./routes/prompt_similarity');
 const sentimentRoutes = require('./routes/prompt_sentiment');
 const searchRoutes = require('./routes/search');
 const scrapeRoutes = require('./routes/scrape');
 const factCheckRoutes = require('./routes/fact_check');
+const auditRoutes = require('./routes/audit');
 
 // Actually use those routes
 app.use('/prompt_similarity', similarityRoutes);
@@ -33,6 +48,7 @@ app.use('/search', searchRoutes);
 app.use('/prompt_sentiment', sentimentRoutes)
 app.use('/scrape', scrapeRoutes)
 app.use('/fact_check', factCheckRoutes)
+app.use('/audit', auditRoutes)
 
 const PORT = process.env.PORT || 5001;
 
@@ -1,43 +1,22 @@
 # similarity.py
 from flask import Flask, request, jsonify
-from transformers import AutoTokenizer, AutoModel
-from sentence_transformers import SentenceTransformer
-from rouge_score import rouge_scorer
-import numpy as np
+from embeddings import get_embedding, cosine_similarity, source_similarities, embedding_cache, encoder_batcher
+from model_registry import registry, register_health_routes
+from lexical import rouge_l, lexical_similarities
+from batching import register_batching_routes
+import instrumentation
+from instrumentation import span
 
 app = Flask(__name__)
 
-# Choose a sentence transformer model built on top of BERT for
-# better semantic understanding to compare sentence similarity
-tokenizer = AutoTokenizer.from_pretrained("distilbert-base-uncased")
-model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
-
-def get_embedding(sentence):
-    return model.encode(sentence)
-
-def cosine_similarity(vec_a, vec_b):
-    # Reshape the vectors to be 1D arrays
-    vec_a = vec_a.flatten()
-    vec_b = vec_b.flatten()
-    
-    # Compute the dot product
-    dot_product = np.dot(vec_a, vec_b)
-    
-    # Compute the norms
-    norm_a = np.linalg.norm(vec_a)
-    norm_b = np.linalg.norm(vec_b)
-    
-    # Compute and return cosine similarity
-    return dot_product / (norm_a * norm_b)
+SIMILARITY_MODELS = ['sentence_encoder', 'rouge_scorer']
+register_health_routes(app, SIMILARITY_MODELS)
+register_batching_routes(app, [encoder_batcher])
+instrumentation.init_app(app, 'similarity', [encoder_batcher])
 
 def calculate_rouge_l(reference, hypothesis):
-    # Initialize the ROUGE scorer
-    scorer = rouge_scorer.RougeScorer(['rougeL'], use_stemmer=True)
-    scores = scorer.score(reference, hypothesis)
-    
-    # Extract and return the ROUGE-L score
-    rouge_l_score = scores['rougeL'].fmeasure
-    return rouge_l_score
+    # Shared ROUGE-L scorer, reusing the cached tokens / stems of texts it has seen before
+    return rouge_l(reference, hypothesis)
 
 @app.route('/similarity', methods=['POST'])
 def calculate_similarity():
@@ -53,7 +32,8 @@ def calculate_similarity():
     similarity_rating, similarity_sentence = calculateSimilarityRating(float(similarity_score))
 
     # Calculate ROUGE-L score
-    rouge_l_score = calculate_rouge_l(question, answer)
+    with span('rouge'):
+        rouge_l_score = calculate_rouge_l(question, answer)
 
     return jsonify({
     'message': 'Cosine Similarity Calculated',
@@ -83,6 +63,55 @@ def calculate_source_similarity():
     'source': source
 })
 
+# Scores one QA element against a list of sources in a single batched encode, for callers that
+# stay remote but would otherwise make one /source_similarity request per sentence
+@app.route('/source_similarity_batch', methods=['POST'])
+def calculate_source_similarity_batch():
+    data = request.get_json()
+    user_qa_element = data.get('user_qa_element')
+    sources = data.get('sources', [])
+
+    if not isinstance(user_qa_element, str):
+        raise ValueError("user_qa_element must be of type: str")
+    if not isinstance(sources, list) or not all(isinstance(item, str) for item in sources):
+        raise ValueError("sources must be of type: list of strings (string[])")
+
+    similarity_scores = source_similarities(user_qa_element, sources)
+
+    return jsonify({
+    'similarityScores': similarity_scores,
+    'user_qa_element': user_qa_element,
+    'sources': sources
+})
+
+# Lexical counterpart of /source_similarity_batch: ROUGE-L and token overlap (Jaccard) of one QA element against
+# every source sentence, which needs no model call and so is cheap enough to run over whole pages
+@app.route('/lexical_similarity_batch', methods=['POST'])
+def calculate_lexical_similarity_batch():
+    data = request.get_json()
+    user_qa_element = data.get('user_qa_element')
+    sources = data.get('sources', [])
+
+    if not isinstance(user_qa_element, str):
+        raise ValueError("user_qa_element must be of type: str")
+    if not isinstance(sources, list) or not all(isinstance(item, str) for item in sources):
+        raise ValueError("sources must be of type: list of strings (string[])")
+
+    with span('lexical'):
+        rouge_l_scores, jaccard_scores = lexical_similarities(user_qa_element, sources)
+
+    return jsonify({
+    'rougeLScores': rouge_l_scores,
+    'jaccardScores': jaccard_scores,
+    'user_qa_element': user_qa_element,
+    'sources': sources
+})
+
+# Reports the embedding cache hit-rate and memory usage
+@app.route('/embedding_cache', methods=['GET'])
+def get_embedding_cache_stats():
+    return jsonify(embedding_cache.stats())
+
 # Calculates and returns the similarity score qualitative rating
 def calculateSimilarityRating(similarityScore):
     if similarityScore < 0.2:
@@ -97,4 +126,6 @@ def calculateSimilarityRating(similarityScore):
         return "Identical", "The question asked and the answer received are identical"
 
 if __name__ == '__main__':
+    # Load the sentence transformer in the background while the server starts (/ready reports when it is warm)
+    registry.start_warm_up(SIMILARITY_MODELS)
     app.run(port=5002)
@@ -0,0 +1,301 @@
+# source_index.py
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from mmap_store import MappedMatrix
+
+# Number of inserted sources after which the index file is rewritten (it is also written at exit)
+INDEX_FLUSH_INTERVAL = 16
+# Compaction runs once superseded / expired rows outnumber live rows (and there are at least this many of them)
+MIN_COMPACTION_ROWS = 1024
+
+# Creates a private directory for a non-persistent index, removed when the process that created it exits
+# (not when a forked child exits, since the child may have inherited it)
+def _private_directory():
+    directory = tempfile.mkdtemp(prefix='source-index-')
+    pid = os.getpid()
+    atexit.register(lambda: os.getpid() == pid and shutil.rmtree(directory, True))
+    return directory
+
+
+# Persistent index of the paragraphs extracted from each scraped source and their unit-length embeddings, so a
+# source audited again (users tend to check against the same handful of reference sites) is answered with one
+# matrix product over rows that are already on disk, without fetching, parsing or encoding the page again.
+#
+# Embeddings live in a memory-mapped float32 matrix, and index.json maps each URL to its paragraph texts, a hash
+# of them, when they were fetched and the matrix rows holding their embeddings. Re-indexing a URL appends new
+# rows and leaves the old ones dead until compaction rewrites the matrix with only the live, unexpired rows.
+#
+# Without a directory the index lives in a private temporary directory for the life of the process. With one it
+# persists across restarts, owned by one process (and the workers it forks) at a time: the first to open it holds
+# an exclusive lock on it, and any other process opening it falls back to a private directory of its own.
+# max_sources=0 disables it.
+class SourceIndex:
+    def __init__(self, model_name, directory=None, ttl=86400, max_sources=1000):
+        self.model_name = model_name
+        self.directory = directory or _private_directory()
+        self.persistent = bool(directory)
+        self._released = False
+        self.ttl = ttl
+        self.max_sources = max_sources
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._sources = {}
+        self._next_row = 0
+        self._unflushed = 0
+        self.hits = 0
+        self.misses = 0
+        self.compactions = 0
+
+        if directory and self.enabled:
+            self._lock_file = self._lock_directory(directory)
+            if self._lock_file is None:
+                print(f"Source index {directory} is in use by another process, using a private directory instead")
+                self.directory = _private_directory()
+                self.persistent = False
+            else:
+                self._load()
+                atexit.register(self.flush)
+
+    # Takes an exclusive lock on the directory, returning the lock file (kept open for the life of the process, and
+    # inherited by forked workers) or None if another process holds it
+    @staticmethod
+    def _lock_directory(directory):
+        os.makedirs(directory, exist_ok=True)
+        lock_file = open(os.path.join(directory, 'lock'), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @property
+    def enabled(self):
+        return self.max_sources > 0
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    @property
+    def _matrix_path(self):
+        return os.path.join(self.directory, 'embeddings.f32')
+
+    @staticmethod
+    def content_hash(paragraphs):
+        return hashlib.sha256('\0'.join(paragraphs).encode('utf-8')).hexdigest()
+
+    # Re-opens a previously persisted index (ignoring it if it was written for a different model)
+    def _load(self):
+        if not os.path.exists(self._index_path):
+            return
+
+        try:
+            with open(self._index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading source index, starting empty: {e}")
+            return
+
+        if index.get('model') != self.model_name:
+            return
+
+        self._sources = index['sources']
+        self._next_row = index['rows']
+        self._matrix = MappedMatrix(self._matrix_path, index['dim'])
+
+    def _is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    # Returns (paragraphs, embeddings) for the first max_paragraphs paragraphs of an indexed source, or None when
+    # the source is not indexed, has expired, or was indexed with fewer paragraphs than are now needed
+    def get(self, url, max_paragraphs=None):
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            entry = self._sources.get(url)
+            covered = entry is not None and (not entry['truncated'] or max_paragraphs is None or len(entry['paragraphs']) >= max_paragraphs)
+            if not covered or not self._is_fresh(entry):
+                self.misses += 1
+                return None
+
+            count = len(entry['paragraphs']) if max_paragraphs is None else min(max_paragraphs, len(entry['paragraphs']))
+            vectors = self._matrix.read(slice(entry['start'], entry['start'] + count)) if count else np.empty((0, 0), dtype=np.float32)
+            self.hits += 1
+            return entry['paragraphs'][:count], vectors
+
+    # Content hash of an indexed source (regardless of freshness), so a re-fetched page that has not changed can be
+    # refreshed with touch() instead of being re-encoded
+    def indexed_hash(self, url):
+        entry = self._sources.get(url)
+        return entry['hash'] if entry is not None else None
+
+    # Marks an indexed source as freshly fetched (its content hash matched the re-fetched page)
+    def touch(self, url, truncated):
+        with self._lock:
+            entry = self._sources.get(url)
+            if entry is not None:
+                entry['fetched_at'] = time.time()
+                entry['truncated'] = truncated
+                self._unflushed += 1
+
+    # Indexes a source's paragraphs and their embeddings (replacing any previous version of the source).
+    # truncated says whether extraction stopped at its paragraph budget before the end of the page
+    def put(self, url, paragraphs, vectors, truncated):
+        if not self.enabled:
+            return
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            if len(paragraphs) and self._matrix is None:
+                self._matrix = MappedMatrix(self._matrix_path, vectors.shape[-1])
+
+            start = self._next_row
+            if len(paragraphs):
+                self._matrix.write(start, vectors)
+                self._next_row += len(paragraphs)
+
+            self._sources.pop(url, None)
+            self._sources[url] = {
+                'hash': self.content_hash(paragraphs),
+                'fetched_at': time.time(),
+                'truncated': truncated,
+                'start': start,
+                'paragraphs': list(paragraphs)
+            }
+
+            # Past the source limit, the least recently indexed sources are dropped (their rows reclaimed on compaction)
+            while len(self._sources) > self.max_sources:
+                self._sources.pop(next(iter(self._sources)))
+
+            live_rows = sum(len(entry['paragraphs']) for entry in self._sources.values())
+            dead_rows = self._next_row - live_rows
+            if dead_rows >= MIN_COMPACTION_ROWS and dead_rows > live_rows:
+                self._compact_locked()
+
+            self._unflushed += 1
+            if self._unflushed >= INDEX_FLUSH_INTERVAL:
+                self._flush_locked()
+
+    # Changes the source limit (0 turns the index off, without dropping what it holds), returning the previous limit
+    def resize(self, max_sources):
+        with self._lock:
+            previous = self.max_sources
+            self.max_sources = max_sources
+            return previous
+
+    # Rewrites the matrix keeping only the rows of live, unexpired sources (in index order), then swaps it in
+    def compact(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._compact_locked()
+
+    # Stops this process writing the index to its persistent directory, which is handed over to another process: the
+    # gunicorn master releases it before forking its workers, so it never flushes its own copy (stale by then) over
+    # theirs when it exits
+    def release(self):
+        with self._lock:
+            self._released = self.persistent
+            self.persistent = False
+
+    # Takes over a released persistent directory, re-reading the index from it (a worker forked from the master
+    # continues from what the worker before it wrote, rather than from the master's copy, and appends after its rows)
+    def reload(self):
+        with self._lock:
+            if not self._released:
+                return
+            if self._matrix is not None:
+                self._matrix.close()
+            self._matrix, self._sources, self._next_row, self._unflushed = None, {}, 0, 0
+            self._load()
+            self._released = False
+            self.persistent = True
+
+    # Moves the index into a private temporary directory (keeping its live entries), so a forked worker stops
+    # writing to the directory it shares with its parent and sibling workers
+    def detach(self):
+        with self._lock:
+            directory = _private_directory()
+            self._compact_locked(directory)
+            self.directory = directory
+            self.persistent = False
+
+    def _compact_locked(self, directory=None):
+        self._sources = {url: entry for url, entry in self._sources.items() if self._is_fresh(entry)}
+        if self._matrix is None:
+            return
+
+        matrix_path = os.path.join(directory or self.directory, 'embeddings.f32')
+        tmp_path = matrix_path + '.compact'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        compacted = MappedMatrix(tmp_path, self._matrix.dim)
+
+        next_row = 0
+        for entry in self._sources.values():
+            count = len(entry['paragraphs'])
+            if count:
+                compacted.write(next_row, self._matrix.read(slice(entry['start'], entry['start'] + count)))
+            entry['start'] = next_row
+            next_row += count
+
+        compacted.close()
+        self._matrix.close()
+        os.replace(tmp_path, matrix_path)
+        self._matrix = MappedMatrix(matrix_path, compacted.dim)
+        self._next_row = next_row
+        self.compactions += 1
+        # The index must be rewritten straight away, since every row has moved
+        if directory is None:
+            self._unflushed += 1
+            self._flush_locked()
+
+    # Persists the index (the matrix first, then the index, so the index never points at unwritten rows)
+    def flush(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        # Nothing to write unless this process changed the index
+        if self._matrix is None or not self.persistent or not self._unflushed:
+            return
+
+        self._matrix.flush()
+        tmp_path = self._index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'model': self.model_name, 'dim': self._matrix.dim, 'rows': self._next_row, 'sources': self._sources}, f)
+        os.replace(tmp_path, self._index_path)
+        self._unflushed = 0
+
+    def stats(self):
+        with self._lock:
+            live_rows = sum(len(entry['paragraphs']) for entry in self._sources.values())
+            lookups = self.hits + self.misses
+            return {
+                'model': self.model_name,
+                'path': self.directory,
+                'sources': len(self._sources),
+                'fresh_sources': sum(1 for entry in self._sources.values() if self._is_fresh(entry)),
+                'live_rows': live_rows,
+                'dead_rows': self._next_row - live_rows,
+                'bytes': self._matrix.nbytes if self._matrix is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'compactions': self.compactions,
+                'ttl': self.ttl
+            }